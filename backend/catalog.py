@@ -0,0 +1,203 @@
+"""
+In-process copy of the tracked-artist catalog.
+
+updateTrackedArtists.py bumps a version document in catalog_meta after every
+sheet sync. CatalogStore notices the bump, either from a change stream on
+that collection or by polling the version every few seconds, loads the new
+catalog and swaps it in as one immutable Catalog snapshot. Requests grab a
+snapshot once and use it throughout, so a reload never changes the catalog
+under a request that is already running.
+
+Plays are matched against the catalog by canonical match keys
+(scripts/match_keys.py), so each snapshot also carries the keyed artists,
+titles and pairs, read from the artist_key/track_keys stored with each
+tracked artist just as plays carry theirs. Title aliases
+(scripts/match_aliases.py) map near-miss play titles onto tracked ones: their
+keys are matched too, and alias_stages() rewrites aliased rows to the tracked
+title before grouping.
+"""
+
+import os
+import time
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+from match_keys import match_key
+
+CATALOG_META_ID = "tracked_artists"
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "30"))
+# Backoff between attempts to reopen a failed change stream
+WATCH_RETRY_SECONDS = 5
+WATCH_MAX_RETRY_SECONDS = 300
+# Server error for $changeStream on a standalone mongod
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+def stored_keys(item) -> Tuple[str, List[str]]:
+    """artist_key and track_keys written by updateTrackedArtists.py, computed for documents without them."""
+    artist_key = item.get("artist_key")
+    track_keys = item.get("track_keys")
+    if artist_key is None or track_keys is None or len(track_keys) != len(item["tracks"]):
+        return match_key(item["artist"]), [match_key(track) for track in item["tracks"]]
+    return artist_key, track_keys
+
+@dataclass(frozen=True)
+class Catalog:
+    version: Optional[int]
+    artists: Tuple[str, ...]
+    tracks: Tuple[str, ...]
+    pairs: FrozenSet[Tuple[str, str]]
+    artist_keys: Tuple[str, ...]
+    title_keys: Tuple[str, ...]
+    key_pairs: FrozenSet[Tuple[str, str]]
+    # (artist_key, alias title_key) -> (tracked title_key, tracked title)
+    aliases: Dict[Tuple[str, str], Tuple[str, str]]
+    # updatedAt of the catalog_meta version, for Last-Modified
+    updated_at: Optional[datetime] = None
+
+    @classmethod
+    def from_documents(cls, documents, version=None, alias_documents=(), updated_at=None):
+        artists = []
+        tracks = []
+        pairs = set()
+        key_pairs = set()
+        for item in documents:
+            artists.append(item["artist"])
+            tracks.extend(item["tracks"])
+            pairs.update((item["artist"], track) for track in item["tracks"])
+            artist_key, track_keys = stored_keys(item)
+            key_pairs.update((artist_key, track_key) for track_key in track_keys)
+
+        aliases = {}
+        for alias in alias_documents:
+            # Aliases of tracks that have since left the catalog are ignored
+            if (alias["artist_key"], alias["title_key"]) in key_pairs:
+                aliases[(alias["artist_key"], alias["alias_key"])] = (alias["title_key"], alias["title"])
+        matched_pairs = key_pairs | set(aliases)
+        return cls(
+            version=version,
+            artists=tuple(artists),
+            tracks=tuple(tracks),
+            pairs=frozenset(pairs),
+            artist_keys=tuple(sorted({artist_key for artist_key, _ in matched_pairs})),
+            title_keys=tuple(sorted({title_key for _, title_key in matched_pairs})),
+            key_pairs=frozenset(key_pairs),
+            aliases=aliases,
+            updated_at=updated_at
+        )
+
+    def tracked_pair(self, artist_key: str, title_key: str) -> Optional[Tuple[str, str]]:
+        """The tracked (artist_key, title_key) a play's keys stand for, or None if untracked."""
+        if (artist_key, title_key) in self.key_pairs:
+            return artist_key, title_key
+        alias = self.aliases.get((artist_key, title_key))
+        return (artist_key, alias[0]) if alias else None
+
+    def artist_title_keys(self, artist_key: str) -> List[str]:
+        """Title keys matched for one artist: tracked titles and their aliases."""
+        matched = {title_key for key, title_key in self.key_pairs if key == artist_key}
+        matched.update(alias_key for key, alias_key in self.aliases if key == artist_key)
+        return sorted(matched)
+
+    def alias_stages(self) -> List[dict]:
+        """Stages giving rows of aliased titles the tracked title_key and title.
+
+        Like the royalty rate table, the aliases are few enough to compile into a $switch.
+        """
+        if not self.aliases:
+            return []
+
+        def switch(position, fallback):
+            return {
+                "$switch": {
+                    "branches": [
+                        {
+                            "case": {"$and": [{"$eq": ["$artist_key", artist_key]}, {"$eq": ["$title_key", alias_key]}]},
+                            "then": tracked[position]
+                        }
+                        for (artist_key, alias_key), tracked in self.aliases.items()
+                    ],
+                    "default": fallback
+                }
+            }
+
+        return [{"$set": {"title": switch(1, "$title"), "title_key": switch(0, "$title_key")}}]
+
+class CatalogStore:
+    def __init__(self, artists_collection, meta_collection, aliases_collection=None, poll_seconds: float = CATALOG_POLL_SECONDS):
+        self.artists_collection = artists_collection
+        self.meta_collection = meta_collection
+        self.aliases_collection = aliases_collection
+        self.poll_seconds = poll_seconds
+        self._snapshot: Optional[Catalog] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._watching = False
+
+    def current(self) -> Catalog:
+        """Return the latest snapshot, checking the stored version at most every poll_seconds."""
+        if self._snapshot is None or (not self._watching and time.monotonic() - self._checked_at >= self.poll_seconds):
+            self.refresh()
+        return self._snapshot
+
+    def stored_version(self) -> Tuple[Optional[int], Optional[datetime]]:
+        """The stored catalog version and its updatedAt."""
+        meta = self.meta_collection.find_one({"_id": CATALOG_META_ID}, {"version": 1, "updatedAt": 1}) or {}
+        return meta.get("version"), meta.get("updatedAt")
+
+    def refresh(self, force: bool = False) -> Catalog:
+        """Reload the catalog if its stored version moved (or always, with force)."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                version, updated_at = self.stored_version()
+            except PyMongoError as e:
+                print(f"Catalog version check failed: {e}")
+                if self._snapshot is not None:
+                    return self._snapshot
+                version, updated_at = None, None
+            if force or self._snapshot is None or version != self._snapshot.version:
+                documents = self.artists_collection.find({}, {"_id": 0, "artist": 1, "tracks": 1, "artist_key": 1, "track_keys": 1})
+                aliases = []
+                if self.aliases_collection is not None:
+                    aliases = self.aliases_collection.find({}, {"_id": 0, "artist_key": 1, "alias_key": 1, "title_key": 1, "title": 1})
+                self._snapshot = Catalog.from_documents(documents, version, aliases, updated_at)
+                print(f"Loaded tracked artist catalog version {version}: {len(self._snapshot.artists)} artists, "
+                      f"{len(self._snapshot.tracks)} tracks, {len(self._snapshot.aliases)} aliases")
+            return self._snapshot
+
+    def watch(self):
+        """Follow catalog_meta with a change stream in a daemon thread.
+
+        Change streams need a replica set (Atlas always has one); on a standalone
+        server the thread exits and current() keeps polling instead. Any other
+        failure falls back to polling while the stream is reopened with backoff.
+        """
+        def follow():
+            delay = WATCH_RETRY_SECONDS
+            while True:
+                try:
+                    with self.meta_collection.watch([{"$match": {"documentKey._id": CATALOG_META_ID}}]) as stream:
+                        self._watching = True
+                        delay = WATCH_RETRY_SECONDS
+                        self.refresh()
+                        for _ in stream:
+                            self.refresh()
+                    print(f"Catalog change stream closed, reopening in {delay:.0f}s")
+                except OperationFailure as e:
+                    if e.code == CHANGE_STREAM_UNSUPPORTED:
+                        print(f"Catalog change streams unsupported, polling every {self.poll_seconds:.0f}s: {e}")
+                        return
+                    print(f"Catalog change stream failed, polling every {self.poll_seconds:.0f}s "
+                          f"and reopening in {delay:.0f}s: {e}")
+                except PyMongoError as e:
+                    print(f"Catalog change stream failed, polling every {self.poll_seconds:.0f}s "
+                          f"and reopening in {delay:.0f}s: {e}")
+                finally:
+                    self._watching = False
+                time.sleep(delay)
+                delay = min(delay * 2, WATCH_MAX_RETRY_SECONDS)
+
+        threading.Thread(target=follow, name="catalog-watch", daemon=True).start()
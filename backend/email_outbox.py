@@ -0,0 +1,247 @@
+"""
+First-play email outbox.
+
+The ingest endpoint only writes notifications to the email_outbox collection;
+a background task started with the API drains it. Queued messages are claimed
+in batches, sent over one SMTP session that stays logged in between batches,
+and marked sent or rescheduled with backoff. Several API workers can run the
+sender side by side because every batch is claimed atomically.
+
+The sender runs whenever an SMTP host is configured; it logs in only when
+SMTP_USER is set, so a local aiosmtpd server (SMTP_HOST=localhost,
+SMTP_STARTTLS=false) works without credentials.
+"""
+
+import os
+import uuid
+import asyncio
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import List, Optional
+
+FIRST_PLAY_EMAIL_RECIPIENT = os.getenv("FIRST_PLAY_EMAIL_RECIPIENT", "richard@setupcomedy.com")
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# Gmail is only assumed when credentials for it are configured
+SMTP_HOST = os.getenv("SMTP_HOST") or ("smtp.gmail.com" if SMTP_USER else None)
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+FIRST_PLAY_EMAIL_SENDER = os.getenv("FIRST_PLAY_EMAIL_SENDER") or SMTP_USER or "sirius-tracker@localhost"
+# Local stand-ins such as aiosmtpd speak plain SMTP without auth
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+
+OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "30"))
+OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+# Send one summary email per batch instead of one email per first play
+FIRST_PLAY_EMAIL_DIGEST = os.getenv("FIRST_PLAY_EMAIL_DIGEST", "false").lower() == "true"
+# A batch claimed by a worker that died mid-send becomes claimable again after this long
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+REPORT_URL = "https://xm.setupcomedy.com"
+
+def first_play_message(artist: str, title: str, channel: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = FIRST_PLAY_EMAIL_SENDER
+    msg["To"] = FIRST_PLAY_EMAIL_RECIPIENT
+    msg["Subject"] = f"New Track Played on Sirius! {artist} - {title}"
+    msg.set_content(f"""{title} by {artist} just played for the first time on {channel}.
+
+See report here: {REPORT_URL}""")
+    return msg
+
+def digest_message(entries: List[dict]) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = FIRST_PLAY_EMAIL_SENDER
+    msg["To"] = FIRST_PLAY_EMAIL_RECIPIENT
+    msg["Subject"] = f"{len(entries)} New Tracks Played on Sirius!"
+    lines = [f"- {entry['title']} by {entry['artist']} on {entry['channel']}" for entry in entries]
+    msg.set_content("These tracks just played for the first time:\n\n" + "\n".join(lines) + f"\n\nSee report here: {REPORT_URL}")
+    return msg
+
+class SmtpSession:
+    """One SMTP connection that stays authenticated across sends and reconnects if the server drops it."""
+
+    def __init__(self, host: str, port: int, user: Optional[str], password: Optional[str], starttls: bool = True):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.server: Optional[smtplib.SMTP] = None
+
+    def connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        self.server = server
+
+    def send(self, msg: EmailMessage):
+        if self.server is None:
+            self.connect()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Idle connections get closed server-side; reconnect once and retry
+            self.connect()
+            self.server.send_message(msg)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+class EmailOutbox:
+    def __init__(self, collection, session: SmtpSession, digest: bool = FIRST_PLAY_EMAIL_DIGEST):
+        self.collection = collection
+        self.session = session
+        self.digest = digest
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Set by stop(); a batch running in a worker thread checks it between messages
+        self._stopping = threading.Event()
+
+    def ensure_indexes(self):
+        self.collection.create_index([("status", 1), ("nextAttemptAt", 1)])
+
+    def enqueue(self, first_plays: List[dict]) -> int:
+        """Queue one notification per first play and wake the sender."""
+        if not first_plays:
+            return 0
+        now = datetime.now(timezone.utc)
+        self.collection.insert_many([
+            {
+                "artist": play["artist"],
+                "title": play["title"],
+                "channel": play["channel"],
+                "status": "pending",
+                "attempts": 0,
+                "createdAt": now,
+                "nextAttemptAt": now
+            }
+            for play in first_plays
+        ])
+        self.wake()
+        return len(first_plays)
+
+    def wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def claim_batch(self) -> List[dict]:
+        """Atomically mark up to OUTBOX_BATCH_SIZE due messages as ours."""
+        now = datetime.now(timezone.utc)
+        claimable = {
+            "$or": [
+                {"status": "pending", "nextAttemptAt": {"$lte": now}},
+                {"status": "sending", "claimedAt": {"$lt": now - CLAIM_TIMEOUT}}
+            ]
+        }
+        ids = [doc["_id"] for doc in self.collection.find(claimable, {"_id": 1}).sort("createdAt", 1).limit(OUTBOX_BATCH_SIZE)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            {"_id": {"$in": ids}, **claimable},
+            {"$set": {"status": "sending", "claimToken": token, "claimedAt": now}}
+        )
+        return list(self.collection.find({"claimToken": token, "status": "sending"}).sort("createdAt", 1))
+
+    def mark_sent(self, docs: List[dict]):
+        self.collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}},
+            {"$set": {"status": "sent", "sentAt": datetime.now(timezone.utc)}, "$inc": {"attempts": 1}, "$unset": {"claimToken": ""}}
+        )
+
+    def release(self, docs: List[dict]):
+        """Hand claimed but unsent messages back to the queue."""
+        self.collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}, "status": "sending"},
+            {"$set": {"status": "pending"}, "$unset": {"claimToken": ""}}
+        )
+
+    def mark_failed(self, docs: List[dict], error: Exception):
+        now = datetime.now(timezone.utc)
+        for doc in docs:
+            attempts = doc.get("attempts", 0) + 1
+            update = {"attempts": attempts, "lastError": str(error)}
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                update["status"] = "failed"
+            else:
+                update["status"] = "pending"
+                update["nextAttemptAt"] = now + timedelta(minutes=2 ** attempts)
+            self.collection.update_one({"_id": doc["_id"]}, {"$set": update, "$unset": {"claimToken": ""}})
+
+    def send_batch(self) -> int:
+        """Send one claimed batch (blocking). Returns the number of messages delivered."""
+        if self._stopping.is_set():
+            return 0
+        docs = self.claim_batch()
+        if not docs:
+            return 0
+
+        if self.digest:
+            try:
+                self.session.send(digest_message(docs))
+            except Exception as e:
+                print(f"Failed to send first play digest: {str(e)}")
+                self.session.close()
+                self.mark_failed(docs, e)
+                return 0
+            self.mark_sent(docs)
+            print(f"First play digest sent for {len(docs)} tracks")
+            return len(docs)
+
+        sent = 0
+        for index, doc in enumerate(docs):
+            if self._stopping.is_set():
+                self.release(docs[index:])
+                break
+            try:
+                self.session.send(first_play_message(doc["artist"], doc["title"], doc["channel"]))
+            except Exception as e:
+                print(f"Failed to send first play email: {str(e)}")
+                self.session.close()
+                self.mark_failed([doc], e)
+                continue
+            self.mark_sent([doc])
+            sent += 1
+            print(f"First play email sent for: {doc['title']} by {doc['artist']}")
+        return sent
+
+    async def run(self):
+        """Drain the outbox whenever woken by enqueue, or every OUTBOX_POLL_SECONDS, until stop()."""
+        while not self._stopping.is_set():
+            try:
+                while await asyncio.to_thread(self.send_batch):
+                    pass
+            except Exception as e:
+                print(f"Email outbox error: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        self._stopping.clear()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Let a batch that is being sent finish its current message, then close the session."""
+        if self._task is not None:
+            self._stopping.set()
+            self.wake()
+            # Cancelling would abandon a send_batch still running in its thread
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self.session.close)
@@ -0,0 +1,180 @@
+"""
+Streaming export of the comedy_tracks collection.
+
+Plays are read in index order with a server-side projection and large cursor
+batches, and encoded batch by batch as CSV, NDJSON or Parquet, so memory use
+stays flat however many plays match. Exports filtered by artist match on
+artist_key and follow the (artist_key, timestamp, _id) index; the others follow
+_id. Every row carries its _id; passing the last one seen as `after` resumes an
+interrupted export where it stopped.
+"""
+
+import io
+import os
+import csv
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from match_keys import match_key
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+EXPORT_FIELDS = ["_id", "id", "timestamp", "title", "artist", "channel"]
+# Sort of artist-filtered exports; must stay the key of the artist_key_timestamp index
+ARTIST_EXPORT_SORT = [("artist_key", 1), ("timestamp", 1), ("_id", 1)]
+ID_EXPORT_SORT = [("_id", 1)]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+def export_filter(
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+    artists: Optional[List[str]] = None,
+    channels: Optional[List[str]] = None
+) -> dict:
+    """Build the find() filter; artists match by artist_key, whatever their spelling."""
+    query = {}
+    if start_dt or end_dt:
+        query["timestamp"] = {}
+        if start_dt:
+            query["timestamp"]["$gte"] = start_dt
+        if end_dt:
+            query["timestamp"]["$lt"] = end_dt
+    if artists:
+        query["artist_key"] = {"$in": sorted({match_key(artist) for artist in artists})}
+    if channels:
+        query["channel"] = {"$in": channels}
+    return query
+
+def export_sort(query: dict) -> List[Tuple[str, int]]:
+    """Index order to read the plays matching query in."""
+    return ARTIST_EXPORT_SORT if "artist_key" in query else ID_EXPORT_SORT
+
+def resume_filter(collection, sort: List[Tuple[str, int]], after: str) -> dict:
+    """Filter for the plays after the one with _id `after` in sort order.
+
+    Raises ValueError for a malformed or unknown `after` id.
+    """
+    if not ObjectId.is_valid(after):
+        raise ValueError(f"Invalid _id to resume after: {after}")
+    after_id = ObjectId(after)
+    if sort == ID_EXPORT_SORT:
+        return {"_id": {"$gt": after_id}}
+
+    last = collection.find_one({"_id": after_id}, {field: 1 for field, _ in sort})
+    if last is None:
+        raise ValueError(f"Unknown _id to resume after: {after}")
+    # (artist_key, timestamp, _id) > the last row's, compared field by field
+    branches = []
+    for position, (field, _) in enumerate(sort):
+        branch = {earlier: last.get(earlier) for earlier, _ in sort[:position]}
+        branch[field] = {"$gt": last.get(field)}
+        branches.append(branch)
+    return {"$or": branches}
+
+def iter_batches(collection, query: dict, sort: List[Tuple[str, int]], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[dict]]:
+    """Yield lists of up to batch_size plays in sort order, as plain export rows."""
+    projection = {field: 1 for field in EXPORT_FIELDS}
+    cursor = collection.find(query, projection).sort(sort).batch_size(batch_size)
+    batch = []
+    try:
+        for doc in cursor:
+            batch.append(export_row(doc))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+def export_row(doc: dict) -> dict:
+    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+    row["_id"] = str(row["_id"])
+    if row["id"] is not None:
+        row["id"] = str(row["id"])
+    if isinstance(row["timestamp"], str):
+        # Plays stored before the timestamp migration
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"].replace("Z", "+00:00"))
+    return row
+
+def text_row(row: dict) -> dict:
+    if isinstance(row["timestamp"], datetime):
+        return {**row, "timestamp": row["timestamp"].isoformat()}
+    return row
+
+def encode_csv(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(text_row(row) for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def encode_ndjson(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(json.dumps(text_row(row)) + "\n" for row in batch).encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def encode_parquet(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    """One Parquet row group per batch; the footer follows the last one."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (field, pa.timestamp("ms", tz="UTC") if field == "timestamp" else pa.string())
+        for field in EXPORT_FIELDS
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "parquet": encode_parquet
+}
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def stream_export(collection, query: dict, sort: List[Tuple[str, int]], fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    return ENCODERS[fmt](iter_batches(collection, query, sort, batch_size))
@@ -0,0 +1,145 @@
+"""
+Local verification of Google Sign-In ID tokens.
+
+Instead of calling Google's tokeninfo endpoint for every login check, tokens
+are verified here: the RS256 signature is checked against Google's published
+JWKS keys (cached for as long as their Cache-Control max-age allows) and
+aud/iss/exp are validated by PyJWT. Tokens that already passed are kept in a
+small TTL cache, so repeat checks are a dictionary lookup.
+
+If Google's JWKS endpoint fails, keys already held keep verifying tokens and
+the fetch is not retried for REFRESH_FAILURE_BACKOFF_SECONDS; only tokens
+signed with a key we don't have get the fetch error (a 503 from the API).
+"""
+
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import jwt
+import requests
+
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when Google's response carries no max-age
+DEFAULT_JWKS_TTL = 3600
+# An unknown kid triggers at most one key refresh per this many seconds
+UNKNOWN_KID_REFRESH_SECONDS = 60
+# After a failed JWKS fetch, wait this long before fetching again
+REFRESH_FAILURE_BACKOFF_SECONDS = 30
+
+def fetch_jwks(url: str) -> Tuple[dict, Optional[int]]:
+    """Download a JWKS document and return it with its Cache-Control max-age, if any."""
+    resp = requests.get(url, timeout=10)
+    resp.raise_for_status()
+    match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+    return resp.json(), int(match.group(1)) if match else None
+
+class GoogleTokenVerifier:
+    def __init__(
+        self,
+        client_id: Optional[str],
+        jwks_url: str = GOOGLE_JWKS_URL,
+        fetch: Callable[[str], Tuple[dict, Optional[int]]] = fetch_jwks,
+        cache_size: int = 1024,
+        cache_ttl: int = 300,
+        clock: Callable[[], float] = time.time
+    ):
+        self.client_id = client_id
+        self.jwks_url = jwks_url
+        self.fetch = fetch
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self._keys: Dict[str, object] = {}
+        self._keys_expire_at = 0.0
+        self._keys_fetched_at = 0.0
+        self._refresh_retry_at = 0.0
+        self._refresh_error: Optional[requests.RequestException] = None
+        self._verified: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        # Guards the key and token caches; never held across a network call
+        self._lock = threading.Lock()
+        # Held by the one thread fetching the JWKS
+        self._refresh_lock = threading.Lock()
+
+    def _refresh_keys(self):
+        jwks, max_age = self.fetch(self.jwks_url)
+        keys = {jwk["kid"]: jwt.PyJWK(jwk).key for jwk in jwks.get("keys", []) if "kid" in jwk}
+        now = self.clock()
+        with self._lock:
+            self._keys = keys
+            self._refresh_error = None
+            self._keys_fetched_at = now
+            self._keys_expire_at = now + (max_age if max_age is not None else DEFAULT_JWKS_TTL)
+
+    def _key_state(self, kid: str):
+        """Return (key or None, whether the keys should be refreshed for kid)."""
+        with self._lock:
+            now = self.clock()
+            if now < self._refresh_retry_at:
+                return self._keys.get(kid), False
+            stale = now >= self._keys_expire_at
+            # Google rotates keys; an unknown kid may just mean our copy is old
+            unknown = kid not in self._keys and now - self._keys_fetched_at >= UNKNOWN_KID_REFRESH_SECONDS
+            return self._keys.get(kid), stale or unknown
+
+    def signing_key(self, kid: str):
+        key, refresh = self._key_state(kid)
+        # One thread fetches; others wait for it only when they have no usable key
+        if refresh and self._refresh_lock.acquire(blocking=key is None):
+            try:
+                key, refresh = self._key_state(kid)
+                if refresh:
+                    try:
+                        self._refresh_keys()
+                    except requests.RequestException as e:
+                        with self._lock:
+                            self._refresh_error = e
+                            self._refresh_retry_at = self.clock() + REFRESH_FAILURE_BACKOFF_SECONDS
+                        if key is None:
+                            raise
+                        print(f"Google JWKS refresh failed, using cached key {kid}: {e}")
+                    key, _ = self._key_state(kid)
+            finally:
+                self._refresh_lock.release()
+        if key is None:
+            with self._lock:
+                error = self._refresh_error if self.clock() < self._refresh_retry_at else None
+            if error is not None:
+                # Still backing off from a failed fetch: the key may exist, we just can't get it
+                raise error
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return key
+
+    def verify(self, token: str) -> dict:
+        """Return the token's claims, or raise jwt.InvalidTokenError."""
+        now = self.clock()
+        with self._lock:
+            cached = self._verified.get(token)
+            if cached is not None:
+                if cached[1] > now:
+                    self._verified.move_to_end(token)
+                    return cached[0]
+                del self._verified[token]
+
+        header = jwt.get_unverified_header(token)
+        key = self.signing_key(header.get("kid", ""))
+        payload = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=self.client_id,
+            options={"require": ["exp", "iss", "aud"]}
+        )
+        if payload["iss"] not in GOOGLE_ISSUERS:
+            raise jwt.InvalidIssuerError("Invalid issuer")
+
+        with self._lock:
+            self._verified[token] = (payload, min(payload["exp"], now + self.cache_ttl))
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return payload
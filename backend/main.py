@@ -1,19 +1,45 @@
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi import FastAPI, Query, Request
 from fastapi.staticfiles import StaticFiles
 from pymongo import MongoClient
-from datetime import datetime, timedelta
-from typing import List, Optional
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
 import json
+import hmac
+import base64
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.middleware.cors import CORSMiddleware
 from zoneinfo import ZoneInfo
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
+import jwt
 import requests
 from pydantic import BaseModel
-import smtplib
-from email.message import EmailMessage
+
+# match_keys.py is shared with the ingest scripts: ./scripts in the image, ../scripts in a checkout
+for scripts_dir in (Path(__file__).resolve().parent / "scripts", Path(__file__).resolve().parent.parent / "scripts"):
+    if scripts_dir.is_dir():
+        sys.path.append(str(scripts_dir))
+from match_keys import match_key
+from catalog import CatalogStore
+from google_auth import GoogleTokenVerifier
+from royalties import RoyaltyRates
+from exporter import ARTIST_EXPORT_SORT, EXPORT_FORMATS, export_filter, export_sort, parquet_available, resume_filter, stream_export
+from response_cache import (
+    CachedResponse, DataVersion, ResponseCache,
+    bucket_window_end, cache_key, is_not_modified, json_default, newest_http_date
+)
+from metrics import (
+    MONGO_COMMAND_DURATION, NOT_MODIFIED, REQUEST_LATENCY, RESPONSE_SIZE,
+    MongoCommandMetrics, log_sampled, sampled_metric
+)
+from email_outbox import EmailOutbox, SmtpSession, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_STARTTLS
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
 
@@ -36,10 +62,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# MongoDB connection
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Observe latency (to the response headers) and body size per route template for /metrics."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_LATENCY.observe((request.method, route, str(response.status_code)), time.perf_counter() - started)
+    length = response.headers.get("content-length")
+    if length:
+        RESPONSE_SIZE.observe((request.method, route), int(length))
+    if response.status_code == 304:
+        NOT_MODIFIED.inc((route,))
+    return response
+
+# Blocking pymongo and HTTP calls run on this bounded pool so they never stall the event loop
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_pool, functools.partial(fn, *args, **kwargs))
+
+@app.on_event("shutdown")
+async def stop_blocking_pool():
+    blocking_pool.shutdown(wait=False)
+
+# MongoDB connection, with one pooled connection per blocking thread
 import certifi
 MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=False, tlsCAFile=certifi.where())
+# Atlas needs TLS; a local mongod (docker-compose, benchmarks) usually runs without it
+MONGO_TLS = os.getenv("MONGO_TLS", "true").lower() != "false"
+tls_options = {"tls": True, "tlsAllowInvalidCertificates": False, "tlsCAFile": certifi.where()} if MONGO_TLS else {}
+client = MongoClient(
+    MONGO_URI,
+    **tls_options,
+    tz_aware=True,
+    event_listeners=[MongoCommandMetrics()],
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", str(BLOCKING_POOL_SIZE))),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "4"))
+)
 try:
     client.admin.command("ping")
     print("✅ MongoDB connection successful")
@@ -50,79 +112,560 @@ db = client["sirius"]
 collection = db["comedy_tracks"]
 tracked_artists_collection = db["tracked_artists"]
 first_plays_collection = db["first_plays"]
+daily_plays_collection = db["daily_plays"]
+
+# Cached dashboard responses, invalidated when plays or the catalog change
+response_cache = ResponseCache()
+plays_data_version = DataVersion(db["data_versions"], "plays")
+royalty_rates = RoyaltyRates(db["royalty_rates"], DataVersion(db["data_versions"], "royalty_rates"))
+cached_plays_version = None
+
+# Tracked artist catalog, reloaded in place when updateTrackedArtists.py bumps its version
+catalog_store = CatalogStore(tracked_artists_collection, db["catalog_meta"], db["title_aliases"])
+catalog_store.refresh()
 
-# Replace loading from JSON with loading from MongoDB
-TRACKED_ARTISTS_DATA = list(tracked_artists_collection.find({}, {"_id": 0, "artist": 1, "tracks": 1}))
-ARTISTS = [item["artist"] for item in TRACKED_ARTISTS_DATA]
-TRACKS = []
-for item in TRACKED_ARTISTS_DATA:
-    TRACKS.extend(item["tracks"])
+@app.on_event("startup")
+async def watch_catalog():
+    catalog_store.watch()
 
 @app.get("/")
 async def read_root():
     return FileResponse("/home/ec2-user/sirius-artist-tracker/backend/static/index.html")
 
-@app.get("/api/artist-plays")
-async def artist_plays(start: Optional[str] = Query(None), end: Optional[str] = Query(None)):
-    def clean_iso(date_str: Optional[str]) -> Optional[datetime]:
-        if date_str:
-            # Parse and convert to Eastern Time (EDT/EST)
-            dt = datetime.fromisoformat(date_str.rstrip("Z"))
-            return dt.astimezone(ZoneInfo("America/New_York"))
-        return None
+EASTERN = ZoneInfo("America/New_York")
 
-    try:
-        # Use Eastern Time for start and end
-        start_dt = clean_iso(start) or datetime(2020, 1, 1, tzinfo=ZoneInfo("America/New_York"))
-        end_dt = clean_iso(end) or datetime.now(ZoneInfo("America/New_York"))
-        print(f"Querying for artists: {ARTISTS}, tracks: {TRACKS}, start: {start_dt}, end: {end_dt}")
-        pipeline = [
+def to_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc)
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse an ISO timestamp from an API payload into a UTC datetime for storage."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return to_utc(dt)
+
+def eastern_midnight(dt: datetime) -> datetime:
+    local = dt.astimezone(EASTERN)
+    return datetime(local.year, local.month, local.day, tzinfo=EASTERN)
+
+def split_window(start_dt: datetime, end_dt: datetime):
+    """Split [start_dt, end_dt) into whole Eastern days and the partial-day edges around them.
+
+    Returns ((first_day, end_day) or None, [(edge_start, edge_end), ...]); whole
+    days are answered from the daily_plays rollups, edges from raw plays.
+    """
+    first_day = eastern_midnight(start_dt)
+    if to_utc(first_day) < to_utc(start_dt):
+        first_day = eastern_midnight(first_day + timedelta(days=1, hours=12))
+    end_day = eastern_midnight(end_dt)
+
+    if to_utc(first_day) >= to_utc(end_day):
+        return None, [(start_dt, end_dt)]
+
+    edges = []
+    if to_utc(start_dt) < to_utc(first_day):
+        edges.append((start_dt, first_day))
+    if to_utc(end_day) < to_utc(end_dt):
+        edges.append((end_day, end_dt))
+    return (first_day, end_day), edges
+
+def play_rows_pipeline(start_dt: datetime, end_dt: datetime, artist_keys: List[str], title_keys: List[str]):
+    """Return (collection, stages) producing one {artist, title, artist_key, title_key, channel,
+    plays, lastPlayed} row per rollup bucket or raw play of a tracked track inside the window."""
+    days, edges = split_window(start_dt, end_dt)
+    catalog_match = {"artist_key": {"$in": artist_keys}, "title_key": {"$in": title_keys}}
+    row_fields = {"_id": 0, "artist": 1, "title": 1, "artist_key": 1, "title_key": 1, "channel": 1}
+
+    raw_stages = []
+    if edges:
+        raw_stages = [
             {
                 "$match": {
-                    "artist": {"$in": ARTISTS},
-                    "title": {"$in": TRACKS},
-                    "timestamp": {"$gte": start_dt.isoformat() + "Z", "$lte": end_dt.isoformat() + "Z"}
+                    **catalog_match,
+                    "$or": [
+                        {"timestamp": {"$gte": to_utc(lo), "$lt": to_utc(hi)}}
+                        for lo, hi in edges
+                    ]
                 }
             },
-            {
-                "$group": {
-                    "_id": "$artist",
-                    "tracks": {
-                        "$push": {
-                            "title": "$title",
-                            "channel": "$channel",
-                            "timestamp": "$timestamp"
-                        }
-                    },
-                    "count": {"$sum": 1}
+            {"$project": {**row_fields, "plays": {"$literal": 1}, "lastPlayed": "$timestamp"}}
+        ]
+    if days is None:
+        return collection, raw_stages
+
+    stages = [
+        {"$match": {**catalog_match, "day": {"$gte": to_utc(days[0]), "$lt": to_utc(days[1])}}},
+        {"$project": {**row_fields, "plays": "$count", "lastPlayed": 1}}
+    ]
+    if raw_stages:
+        stages.append({"$unionWith": {"coll": collection.name, "pipeline": raw_stages}})
+    return daily_plays_collection, stages
+
+# Collapse priced rollup buckets and raw plays into one row per artist/title/channel,
+# grouped on match keys and labelled with one of the stored spellings
+TRACK_CHANNEL_GROUP = {
+    "$group": {
+        "_id": {"artist_key": "$artist_key", "title_key": "$title_key", "channel": "$channel"},
+        "artist": {"$first": "$artist"},
+        "title": {"$first": "$title"},
+        "plays": {"$sum": "$plays"},
+        "royalties": {"$sum": "$royalty"},
+        "featuredRoyalties": {"$sum": "$featuredRoyalty"},
+        "lastPlayed": {"$max": "$lastPlayed"}
+    }
+}
+
+def rounded(field):
+    return {"$round": [field, 2]}
+
+# view=plays: per artist, a flat list of title/channel entries with a plays count
+PLAYS_VIEW_STAGES = [
+    TRACK_CHANNEL_GROUP,
+    {
+        "$group": {
+            "_id": "$_id.artist_key",
+            "artist": {"$first": "$artist"},
+            "tracks": {
+                "$push": {
+                    "title": "$title",
+                    "channel": "$_id.channel",
+                    "timestamp": "$lastPlayed",
+                    "plays": "$plays",
+                    "royalties": rounded("$royalties")
                 }
             },
-            {
-                "$sort": {"count": -1}
-            },
-            {
-                "$project": {
-                    "artist": "$_id",
-                    "tracks": {
-                        "$sortArray": {
-                            "input": "$tracks",
-                            "sortBy": {"title": 1}
-                        }
-                    },
-                    "count": 1,
-                    "_id": 0
+            "count": {"$sum": "$plays"},
+            "royalties": {"$sum": "$royalties"},
+            "featuredRoyalties": {"$sum": "$featuredRoyalties"}
+        }
+    },
+    {
+        "$sort": {"count": -1}
+    },
+    {
+        "$project": {
+            "artist": 1,
+            "tracks": {
+                "$sortArray": {
+                    "input": "$tracks",
+                    "sortBy": {"title": 1}
                 }
-            }
-        ]
-        results = list(collection.aggregate(pipeline, collation={"locale": "en", "strength": 2}))
-        print(f"Query results: {results}")
-        return {"data": results}
-    except ValueError as e:
+            },
+            "count": 1,
+            "royalties": rounded("$royalties"),
+            "featuredRoyalties": rounded("$featuredRoyalties"),
+            "_id": 0
+        }
+    }
+]
+
+# view=breakdown: per artist, title -> {count, channels: [{name, lastPlayed}]}
+BREAKDOWN_VIEW_STAGES = [
+    TRACK_CHANNEL_GROUP,
+    {
+        "$group": {
+            "_id": {"artist_key": "$_id.artist_key", "title_key": "$_id.title_key"},
+            "artist": {"$first": "$artist"},
+            "title": {"$first": "$title"},
+            "count": {"$sum": "$plays"},
+            "royalties": {"$sum": "$royalties"},
+            "featuredRoyalties": {"$sum": "$featuredRoyalties"},
+            "channels": {"$push": {"name": "$_id.channel", "lastPlayed": "$lastPlayed"}}
+        }
+    },
+    {
+        "$sort": {"title": 1}
+    },
+    {
+        "$group": {
+            "_id": "$_id.artist_key",
+            "artist": {"$first": "$artist"},
+            "count": {"$sum": "$count"},
+            "royalties": {"$sum": "$royalties"},
+            "featuredRoyalties": {"$sum": "$featuredRoyalties"},
+            "tracks": {"$push": {"k": "$title", "v": {"count": "$count", "royalties": rounded("$royalties"), "channels": "$channels"}}}
+        }
+    },
+    {
+        "$sort": {"count": -1}
+    },
+    {
+        "$project": {
+            "_id": 0,
+            "artist": 1,
+            "count": 1,
+            "royalties": rounded("$royalties"),
+            "featuredRoyalties": rounded("$featuredRoyalties"),
+            "trackBreakdown": {"$arrayToObject": "$tracks"}
+        }
+    }
+]
+
+ARTIST_PLAYS_VIEWS = {
+    "plays": PLAYS_VIEW_STAGES,
+    "breakdown": BREAKDOWN_VIEW_STAGES
+}
+
+def query_artist_plays(catalog, rates, start_dt: datetime, end_dt: datetime, view: str):
+    source, stages = play_rows_pipeline(start_dt, end_dt, list(catalog.artist_keys), list(catalog.title_keys))
+    pipeline = stages + catalog.alias_stages() + [rates.stage()] + ARTIST_PLAYS_VIEWS[view]
+    return list(source.aggregate(pipeline))
+
+def current_data_versions(force: bool = False):
+    """Catalog snapshot, royalty rate table and plays version that cached responses are keyed on."""
+    global cached_plays_version
+    catalog = catalog_store.current()
+    rates = royalty_rates.current()
+    plays_version = plays_data_version.current(force=force)
+    if plays_version != cached_plays_version:
+        # Every key moved; free the memory held by the old entries
+        cached_plays_version = plays_version
+        response_cache.clear()
+    return catalog, rates, plays_version
+
+def last_modified_of(catalog, rates) -> Optional[str]:
+    """Last-Modified matching the versions in the cache key: plays, catalog and royalty rates."""
+    return newest_http_date(plays_data_version.updated_at, catalog.updated_at, rates.updated_at)
+
+def parse_eastern(date_str: Optional[str]) -> Optional[datetime]:
+    """An ISO date query parameter in Eastern Time (EDT/EST), or None when absent."""
+    if date_str:
+        dt = datetime.fromisoformat(date_str.rstrip("Z"))
+        return dt.astimezone(EASTERN)
+    return None
+
+def requested_window(start: Optional[str], end: Optional[str]) -> Tuple[datetime, datetime]:
+    """[start, end) of a dashboard query; end is not yet rounded to the cache bucket."""
+    start_dt = parse_eastern(start) or datetime(2020, 1, 1, tzinfo=EASTERN)
+    end_dt = parse_eastern(end) or datetime.now(EASTERN)
+    return start_dt, end_dt
+
+def error_response(e: Exception) -> dict:
+    """Error body the dashboard endpoints answer with when a query fails."""
+    if isinstance(e, ValueError):
         print(f"ValueError: {str(e)}")
         return {"error": f"Invalid date format: {str(e)}"}
+    print(f"Error: {str(e)}")
+    return {"error": f"An error occurred: {str(e)}"}
+
+def cached_json_response(request: Request, key: str, last_modified: Optional[str], build) -> Response:
+    """Serve a JSON body from the response cache, answering revalidations with 304."""
+    etag = f'W/"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(key)
+    if cached is None:
+        body = json.dumps(build(), default=json_default).encode()
+        cached = response_cache.put(key, CachedResponse(body, etag, last_modified))
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@app.get("/api/artist-plays")
+async def artist_plays(
+    request: Request,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    view: str = Query("plays")
+):
+    if view not in ARTIST_PLAYS_VIEWS:
+        return {"error": f"Unknown view: {view}"}
+
+    try:
+        start_dt, end_dt = requested_window(start, end)
+        end_dt = bucket_window_end(end_dt).astimezone(EASTERN)
+
+        catalog, rates, plays_version = await run_blocking(current_data_versions)
+        key = cache_key("artist-plays", view, to_utc(start_dt), to_utc(end_dt), plays_version, catalog.version, rates.version)
+        last_modified = last_modified_of(catalog, rates)
+
+        def build():
+            started = time.perf_counter()
+            results = query_artist_plays(catalog, rates, start_dt, end_dt, view)
+            log_sampled(
+                "artist_plays", view=view, start=start_dt, end=end_dt, artists=len(results),
+                catalogArtists=len(catalog.artists), catalogTracks=len(catalog.tracks),
+                queryMs=round((time.perf_counter() - started) * 1000, 1)
+            )
+            return {"data": results}
+
+        return await run_blocking(cached_json_response, request, key, last_modified, build)
+    except Exception as e:
+        return error_response(e)
+
+ARTISTS_PAGE_SIZE = int(os.getenv("ARTISTS_PAGE_SIZE", "25"))
+ARTISTS_MAX_PAGE_SIZE = 200
+
+def encode_cursor(row) -> str:
+    """Opaque cursor pointing just past row in (count desc, artist_key asc) order."""
+    return base64.urlsafe_b64encode(json.dumps([row["count"], row["artistKey"]]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    count, artist_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(count, int) or not isinstance(artist_key, str):
+        raise ValueError("malformed cursor")
+    return count, artist_key
+
+def query_artist_page(catalog, rates, start_dt: datetime, end_dt: datetime, artist_keys: List[str], after, limit: int):
+    """One page of artists ranked by plays, with the cursor of the next page (None on the last one).
+
+    Aliases only rename titles, so the ranking skips alias_stages().
+    """
+    source, stages = play_rows_pipeline(start_dt, end_dt, artist_keys, list(catalog.title_keys))
+    pipeline = stages + [
+        rates.stage(),
+        {
+            "$group": {
+                "_id": "$artist_key",
+                "artist": {"$first": "$artist"},
+                "count": {"$sum": "$plays"},
+                "royalties": {"$sum": "$royalty"},
+                "featuredRoyalties": {"$sum": "$featuredRoyalty"}
+            }
+        },
+        {"$sort": {"count": -1, "_id": 1}}
+    ]
+    if after is not None:
+        count, artist_key = after
+        pipeline.append({"$match": {"$or": [{"count": {"$lt": count}}, {"count": count, "_id": {"$gt": artist_key}}]}})
+    pipeline += [
+        {"$limit": limit + 1},
+        {
+            "$project": {
+                "_id": 0,
+                "artistKey": "$_id",
+                "artist": 1,
+                "count": 1,
+                "royalties": rounded("$royalties"),
+                "featuredRoyalties": rounded("$featuredRoyalties")
+            }
+        }
+    ]
+    rows = list(source.aggregate(pipeline, allowDiskUse=True))
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+@app.get("/api/artists")
+async def artists(
+    request: Request,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    limit: int = Query(ARTISTS_PAGE_SIZE, ge=1, le=ARTISTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    q: Optional[str] = Query(None)
+):
+    """Tracked artists ranked by plays in [start, end), limit at a time.
+
+    Pass the returned nextCursor to get the following page and q to keep only
+    artists whose name contains it. Per-track detail comes from
+    /api/artists/{artist}/breakdown.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except (ValueError, TypeError):
+        return {"error": "Invalid cursor"}
+
+    try:
+        start_dt, end_dt = requested_window(start, end)
+        end_dt = bucket_window_end(end_dt).astimezone(EASTERN)
+
+        catalog, rates, plays_version = await run_blocking(current_data_versions)
+        search = (q or "").strip().lower()
+        artist_keys = list(catalog.artist_keys)
+        if search:
+            artist_keys = sorted({match_key(artist) for artist in catalog.artists if search in artist.lower()})
+        key = cache_key(
+            "artists", to_utc(start_dt), to_utc(end_dt), limit, after, search,
+            plays_version, catalog.version, rates.version
+        )
+        last_modified = last_modified_of(catalog, rates)
+
+        def build():
+            started = time.perf_counter()
+            rows, next_cursor = query_artist_page(catalog, rates, start_dt, end_dt, artist_keys, after, limit)
+            log_sampled(
+                "artists", start=start_dt, end=end_dt, limit=limit, paged=after is not None, search=bool(search),
+                artists=len(rows), queryMs=round((time.perf_counter() - started) * 1000, 1)
+            )
+            return {"data": rows, "nextCursor": next_cursor}
+
+        return await run_blocking(cached_json_response, request, key, last_modified, build)
+    except Exception as e:
+        return error_response(e)
+
+def query_artist_breakdown(catalog, rates, start_dt: datetime, end_dt: datetime, artist_key: str):
+    """One artist's title -> {count, channels} breakdown, or None without plays in the window."""
+    source, stages = play_rows_pipeline(start_dt, end_dt, [artist_key], catalog.artist_title_keys(artist_key))
+    pipeline = stages + catalog.alias_stages() + [rates.stage()] + BREAKDOWN_VIEW_STAGES
+    return next(source.aggregate(pipeline), None)
+
+@app.get("/api/artists/{artist}/breakdown")
+async def artist_breakdown(
+    request: Request,
+    artist: str,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None)
+):
+    """Per-track and per-channel plays of one tracked artist (by name or artistKey) in [start, end)."""
+    try:
+        start_dt, end_dt = requested_window(start, end)
+        end_dt = bucket_window_end(end_dt).astimezone(EASTERN)
+
+        catalog, rates, plays_version = await run_blocking(current_data_versions)
+        artist_key = match_key(artist)
+        if artist_key not in catalog.artist_keys:
+            return {"error": f"Artist not tracked: {artist}"}
+        key = cache_key(
+            "artist-breakdown", artist_key, to_utc(start_dt), to_utc(end_dt),
+            plays_version, catalog.version, rates.version
+        )
+        last_modified = last_modified_of(catalog, rates)
+
+        def build():
+            started = time.perf_counter()
+            result = query_artist_breakdown(catalog, rates, start_dt, end_dt, artist_key)
+            log_sampled(
+                "artist_breakdown", artist=artist_key, start=start_dt, end=end_dt,
+                tracks=len(result["trackBreakdown"]) if result else 0,
+                queryMs=round((time.perf_counter() - started) * 1000, 1)
+            )
+            return {"data": result}
+
+        return await run_blocking(cached_json_response, request, key, last_modified, build)
+    except Exception as e:
+        return error_response(e)
+
+def period_rows(catalog, rates, start_dt: datetime, end_dt: datetime, period: str):
+    source, stages = play_rows_pipeline(start_dt, end_dt, list(catalog.artist_keys), list(catalog.title_keys))
+    return source, stages + catalog.alias_stages() + [rates.stage(), {"$set": {"period": period}}]
+
+def period_counts(group_by: str, label: str):
+    """$facet branch counting current and previous plays per value of group_by, named by label."""
+    def sum_in(period, field):
+        return {"$sum": {"$cond": [{"$eq": ["$period", period]}, field, 0]}}
+
+    return [
+        {
+            "$group": {
+                "_id": group_by,
+                "name": {"$first": label},
+                "count": sum_in("current", "$plays"),
+                "previousCount": sum_in("previous", "$plays"),
+                "royalties": sum_in("current", "$royalty"),
+                "previousRoyalties": sum_in("previous", "$royalty")
+            }
+        },
+        {"$sort": {"count": -1, "previousCount": -1, "_id": 1}},
+        {
+            "$project": {
+                "_id": 0,
+                "name": 1,
+                "count": 1,
+                "previousCount": 1,
+                "royalties": rounded("$royalties"),
+                "previousRoyalties": rounded("$previousRoyalties")
+            }
+        }
+    ]
+
+def query_summary(catalog, rates, start_dt: datetime, end_dt: datetime, prev_start_dt: datetime, prev_end_dt: datetime):
+    """Totals, per-artist and per-channel counts and royalties for a window and its comparison window, in one aggregation."""
+    source, stages = period_rows(catalog, rates, start_dt, end_dt, "current")
+    prev_source, prev_stages = period_rows(catalog, rates, prev_start_dt, prev_end_dt, "previous")
+    pipeline = stages + [
+        {"$unionWith": {"coll": prev_source.name, "pipeline": prev_stages}},
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": "$period",
+                            "spins": {"$sum": "$plays"},
+                            "royalties": {"$sum": "$royalty"},
+                            "featuredRoyalties": {"$sum": "$featuredRoyalty"}
+                        }
+                    }
+                ],
+                "artists": period_counts("$artist_key", "$artist"),
+                "channels": period_counts("$channel", "$channel")
+            }
+        }
+    ]
+    facets = next(source.aggregate(pipeline, allowDiskUse=True))
+
+    totals_by_period = {doc["_id"]: doc for doc in facets["totals"]}
+    artists = [{"artist": row.pop("name"), **row} for row in facets["artists"]]
+    channels = [{"channel": row.pop("name"), **row} for row in facets["channels"]]
+
+    def totals(period, count_field):
+        period_totals = totals_by_period.get(period, {})
+        return {
+            "spins": period_totals.get("spins", 0),
+            "royalties": round(period_totals.get("royalties", 0), 2),
+            "featuredRoyalties": round(period_totals.get("featuredRoyalties", 0), 2),
+            "artists": sum(1 for row in artists if row[count_field] > 0)
+        }
+
+    current = totals("current", "count")
+    previous = totals("previous", "previousCount")
+    percent_change = None
+    if previous["royalties"]:
+        percent_change = round((current["royalties"] - previous["royalties"]) / previous["royalties"] * 100, 1)
+
+    return {
+        "current": current,
+        "previous": previous,
+        "percentChange": percent_change,
+        "artists": artists,
+        "channels": channels
+    }
+
+@app.get("/api/summary")
+async def summary(
+    request: Request,
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    prev_start: Optional[str] = Query(None),
+    prev_end: Optional[str] = Query(None)
+):
+    """Dashboard header numbers for [start, end) compared with [prev_start, prev_end).
+
+    Without prev_start/prev_end the comparison window is the one of equal length
+    immediately before start.
+    """
+    try:
+        start_dt, end_dt = requested_window(start, end)
+        prev_start_dt = parse_eastern(prev_start)
+        prev_end_dt = parse_eastern(prev_end)
+        if prev_start_dt is None or prev_end_dt is None:
+            # Same length as the requested window; rounding end_dt up only adds time without plays yet
+            prev_end_dt = start_dt
+            prev_start_dt = start_dt - (end_dt - start_dt)
+        end_dt = bucket_window_end(end_dt).astimezone(EASTERN)
+
+        catalog, rates, plays_version = await run_blocking(current_data_versions)
+        key = cache_key(
+            "summary", to_utc(start_dt), to_utc(end_dt), to_utc(prev_start_dt), to_utc(prev_end_dt),
+            plays_version, catalog.version, rates.version
+        )
+        last_modified = last_modified_of(catalog, rates)
+
+        def build():
+            started = time.perf_counter()
+            result = query_summary(catalog, rates, start_dt, end_dt, prev_start_dt, prev_end_dt)
+            log_sampled(
+                "summary", start=start_dt, end=end_dt, current=result["current"], previous=result["previous"],
+                queryMs=round((time.perf_counter() - started) * 1000, 1)
+            )
+            return {"data": result}
+
+        return await run_blocking(cached_json_response, request, key, last_modified, build)
     except Exception as e:
-        print(f"Error: {str(e)}")
-        return {"error": f"An error occurred: {str(e)}"}
+        return error_response(e)
 
 @app.get("/date-range/{period}")
 async def get_date_range(period: str):
@@ -145,115 +688,167 @@ GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 class TokenRequest(BaseModel):
     credential: str
 
-@app.post("/verify-google-token")
-async def verify_token(data: TokenRequest):
-    try:
-        resp = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={data.credential}")
-        if resp.status_code != 200:
-            return JSONResponse(content={"allowed": False, "error": "Invalid token"}, status_code=401)
-        payload = resp.json()
-        email = payload.get("email")
-        aud = payload.get("aud")
-        allowed_emails = set(e.strip() for e in os.getenv("ALLOWED_EMAILS", "").split(",") if e.strip())
-        if aud == GOOGLE_CLIENT_ID and email in allowed_emails:
-            return {"allowed": True}
-        else:
-            return {"allowed": False}
-    except Exception as e:
-        return JSONResponse(content={"allowed": False, "error": str(e)}, status_code=500)
+google_token_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID)
 
+@app.post("/verify-google-token")
 @app.post("/api/verify-google-token")
 async def verify_token(data: TokenRequest):
     try:
-        resp = requests.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={data.credential}")
-        if resp.status_code != 200:
-            return JSONResponse(content={"allowed": False, "error": "Invalid token"}, status_code=401)
-        payload = resp.json()
-        email = payload.get("email")
-        aud = payload.get("aud")
-        allowed_emails = set(e.strip() for e in os.getenv("ALLOWED_EMAILS", "").split(",") if e.strip())
-        if aud == GOOGLE_CLIENT_ID and email in allowed_emails:
-            return {"allowed": True}
-        else:
-            return {"allowed": False}
+        payload = await run_blocking(google_token_verifier.verify, data.credential)
+    except jwt.InvalidTokenError:
+        return JSONResponse(content={"allowed": False, "error": "Invalid token"}, status_code=401)
+    except requests.RequestException as e:
+        print(f"Google signing key fetch failed: {e}")
+        return JSONResponse(content={"allowed": False, "error": "Sign-in is temporarily unavailable"}, status_code=503)
     except Exception as e:
         return JSONResponse(content={"allowed": False, "error": str(e)}, status_code=500)
 
-# Email configuration
-FIRST_PLAY_EMAIL_RECIPIENT = os.getenv("FIRST_PLAY_EMAIL_RECIPIENT", "richard@setupcomedy.com")
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    if email_allowed(payload.get("email")):
+        return {"allowed": True}
+    else:
+        return {"allowed": False}
 
-def send_first_play_email_sync(artist: str, title: str, channel: str):
-    """Send email notification for first-time track play (synchronous)"""
-    try:
-        if not SMTP_USER or not SMTP_PASSWORD:
-            print("SMTP credentials not configured, skipping email")
-            return
+def email_allowed(email: Optional[str]) -> bool:
+    allowed_emails = set(e.strip() for e in os.getenv("ALLOWED_EMAILS", "").split(",") if e.strip())
+    return email in allowed_emails
 
-        # Create message
-        msg = EmailMessage()
-        msg["From"] = SMTP_USER
-        msg["To"] = FIRST_PLAY_EMAIL_RECIPIENT
-        msg["Subject"] = f"New Track Played on Sirius! {artist} - {title}"
-        
-        # Email body
-        body = f"""{title} by {artist} just played for the first time on {channel}.
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
 
-See report here: https://xm.setupcomedy.com"""
-        
-        msg.set_content(body)
+async def export_authorized(request: Request) -> bool:
+    """Accept "Authorization: Bearer <token>" carrying EXPORT_API_KEY or an allowed user's Google ID token.
 
-        # Send email
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
+    Raises requests.RequestException when Google's signing keys cannot be fetched.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    if EXPORT_API_KEY and hmac.compare_digest(token, EXPORT_API_KEY):
+        return True
+    try:
+        payload = await run_blocking(google_token_verifier.verify, token)
+    except jwt.InvalidTokenError:
+        return False
+    return email_allowed(payload.get("email"))
+
+@app.get("/api/export/plays")
+async def export_plays(
+    request: Request,
+    format: str = Query("csv"),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    artist: Optional[List[str]] = Query(None),
+    channel: Optional[List[str]] = Query(None),
+    after: Optional[str] = Query(None)
+):
+    """Stream matching comedy_tracks plays in index order; pass the last _id received as `after` to resume."""
+    try:
+        authorized = await export_authorized(request)
+    except requests.RequestException as e:
+        print(f"Google signing key fetch failed: {e}")
+        return JSONResponse(content={"error": "Token verification is temporarily unavailable"}, status_code=503)
+    if not authorized:
+        return JSONResponse(content={"error": "Unauthorized"}, status_code=401)
+    if format not in EXPORT_FORMATS:
+        return JSONResponse(content={"error": f"Unknown format: {format}"}, status_code=400)
+    if format == "parquet" and not parquet_available():
+        return JSONResponse(content={"error": "Parquet export needs pyarrow installed on the server"}, status_code=400)
 
-        print(f"First play email sent for: {title} by {artist}")
+    try:
+        query = export_filter(parse_timestamp(start), parse_timestamp(end), artist, channel)
+        sort = export_sort(query)
+        if after:
+            resume = await run_blocking(resume_filter, collection, sort, after)
+            query = {"$and": [query, resume]} if query else resume
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"comedy_tracks_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    print(f"Exporting plays as {format}: {query}")
+    # Starlette iterates the blocking generator in its threadpool
+    return StreamingResponse(
+        stream_export(collection, query, sort, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# First-play notifications are queued here and sent by a background task
+email_outbox = EmailOutbox(
+    db["email_outbox"],
+    SmtpSession(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, starttls=SMTP_STARTTLS)
+)
 
-    except Exception as e:
-        print(f"Failed to send first play email: {str(e)}")
+@app.on_event("startup")
+async def start_email_outbox():
+    if not SMTP_HOST:
+        print("SMTP_HOST not configured, first play emails will stay queued")
+        return
+    email_outbox.start()
+
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    await email_outbox.stop()
+
+def check_and_record_first_plays(plays_data):
+    """Check for first-time plays and queue notifications
 
-async def check_and_record_first_plays(plays_data):
-    """Check for first-time plays and send notifications"""
+    Plays are filtered against the in-memory catalog, existing first plays are
+    looked up with one query, and new ones are recorded with one insert_many
+    that leans on the unique (artist_key, title_key) index to reject races.
+    """
     try:
         current_time = datetime.now(ZoneInfo("America/New_York"))
-        
+        catalog = catalog_store.current()
+
+        # Earliest play in this batch for each tracked artist/title
+        candidates = {}
         for play in plays_data:
             artist = play.get("artist")
             title = play.get("title") 
             channel = play.get("channel")
-            timestamp = play.get("timestamp")
 
             if not all([artist, title, channel]):
                 continue
-
-            # Check if this artist/title combo is tracked
-            tracked_artist = tracked_artists_collection.find_one({"artist": artist})
-            if not tracked_artist or title not in tracked_artist.get("tracks", []):
+            keys = catalog.tracked_pair(match_key(artist), match_key(title))
+            if keys is None:
                 continue
 
-            # Check if we've already recorded this as a first play
-            existing_first_play = first_plays_collection.find_one({
+            timestamp = parse_timestamp(play.get("timestamp"))
+            earlier = candidates.get(keys)
+            if earlier and (not timestamp or not earlier["timestamp"] or earlier["timestamp"] <= timestamp):
+                continue
+            candidates[keys] = {
                 "artist": artist,
-                "title": title
-            })
-
-            if not existing_first_play:
-                # This is a first play! Record it and send email
-                first_plays_collection.insert_one({
-                    "artist": artist,
-                    "title": title,
-                    "firstPlayDate": current_time.isoformat(),
-                    "channel": channel,
-                    "timestamp": timestamp
-                })
-
-                # Send email notification (now synchronous)
-                send_first_play_email_sync(artist, title, channel)
+                "title": title,
+                "artist_key": keys[0],
+                "title_key": keys[1],
+                "firstPlayDate": current_time,
+                "channel": channel,
+                "timestamp": timestamp
+            }
+
+        if not candidates:
+            return
+
+        # Drop the ones we've already recorded as a first play
+        existing = first_plays_collection.find(
+            {"$or": [{"artist_key": artist_key, "title_key": title_key} for artist_key, title_key in candidates]},
+            {"_id": 0, "artist_key": 1, "title_key": 1}
+        )
+        for doc in existing:
+            candidates.pop((doc["artist_key"], doc["title_key"]), None)
+        if not candidates:
+            return
+
+        new_first_plays = list(candidates.values())
+        try:
+            first_plays_collection.insert_many(new_first_plays, ordered=False)
+        except BulkWriteError as e:
+            # Another request recorded some of these first; only notify for ours
+            rejected = {error["index"] for error in e.details.get("writeErrors", [])}
+            new_first_plays = [doc for index, doc in enumerate(new_first_plays) if index not in rejected]
+
+        email_outbox.enqueue(new_first_plays)
 
     except Exception as e:
         print(f"Error checking first plays: {str(e)}")
@@ -261,8 +856,11 @@ async def check_and_record_first_plays(plays_data):
 # Add this function to process new plays (call this when you receive new SiriusXM data)
 async def process_new_plays(plays_data):
     """Process new plays and check for first-time plays"""
+    # The sender already bumped the plays version; pick it up now rather than at the next poll
+    await run_blocking(current_data_versions, True)
+
     # Check for first plays
-    await check_and_record_first_plays(plays_data)
+    await run_blocking(check_and_record_first_plays, plays_data)
     
     # Continue with your existing play processing logic
     # ... (your existing code to save plays to main collection)
@@ -281,12 +879,99 @@ async def ingest_plays(request: Request):
 @app.post("/api/test-first-play-email")
 async def test_first_play_email():
     """Test endpoint for first play email"""
-    send_first_play_email_sync("Test Artist", "Test Song", "Test Channel")
-    return {"status": "Test email sent"}
+    await run_blocking(email_outbox.enqueue, [{"artist": "Test Artist", "title": "Test Song", "channel": "Test Channel"}])
+    return {"status": "Test email queued"}
+
+METRICS_API_KEY = os.getenv("METRICS_API_KEY")
+
+def ingest_metrics():
+    """Gauges from the latest getTracks.py run recorded in ingest_runs."""
+    run = db["ingest_runs"].find_one({}, sort=[("finishedAt", -1)])
+    if not run:
+        return []
+    stations = run.get("stations", [])
+
+    def per_station(field):
+        return [({"station": station["name"]}, station.get(field) or 0) for station in stations]
+
+    return (
+        sampled_metric("sirius_ingest_last_run_timestamp_seconds", "When the latest ingest run finished.",
+                       [({}, run["finishedAt"].timestamp())])
+        + sampled_metric("sirius_ingest_run_duration_seconds", "Duration of the latest ingest run.",
+                         [({}, run.get("durationSeconds", 0))])
+        + sampled_metric("sirius_ingest_station_fetch_seconds", "Fetch time per station in the latest ingest run.",
+                         per_station("fetchSeconds"))
+        + sampled_metric("sirius_ingest_station_items", "Plays returned per station in the latest ingest run.",
+                         per_station("items"))
+        + sampled_metric("sirius_ingest_station_new_plays", "New plays stored per station in the latest ingest run.",
+                         per_station("newPlays"))
+        + sampled_metric("sirius_ingest_station_up", "Whether each station was fetched in the latest ingest run.",
+                         [({"station": station["name"]}, 0 if station.get("status") == "failed" else 1) for station in stations])
+    )
+
+def render_metrics() -> str:
+    lookups = response_cache.hits + response_cache.misses
+    lines = (
+        REQUEST_LATENCY.render()
+        + RESPONSE_SIZE.render()
+        + NOT_MODIFIED.render()
+        + MONGO_COMMAND_DURATION.render()
+        + sampled_metric("sirius_response_cache_hits_total", "Response cache hits.", [({}, response_cache.hits)], "counter")
+        + sampled_metric("sirius_response_cache_misses_total", "Response cache misses.", [({}, response_cache.misses)], "counter")
+        + sampled_metric("sirius_response_cache_hit_ratio", "Response cache hits over lookups since start.",
+                         [({}, response_cache.hits / lookups if lookups else 0)])
+        + sampled_metric("sirius_response_cache_entries", "Responses held in the cache.", [({}, len(response_cache))])
+        + sampled_metric("sirius_response_cache_bytes", "Bytes held in the response cache.", [({}, response_cache.size)])
+    )
+    try:
+        lines += ingest_metrics()
+    except Exception as e:
+        print(f"Ingest metrics unavailable: {e}")
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus metrics; needs "Authorization: Bearer <METRICS_API_KEY>" when that is set."""
+    if METRICS_API_KEY:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token, METRICS_API_KEY):
+            return JSONResponse(content={"error": "Unauthorized"}, status_code=401)
+    body = await run_blocking(render_metrics)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Add this after your existing database setup
 try:
-    first_plays_collection.create_index([("artist", 1), ("title", 1)], unique=True)
+    # Unique on match keys; fails until scripts/backfill_match_keys.py has keyed existing first plays
+    first_plays_collection.create_index([("artist_key", 1), ("title_key", 1)], unique=True, name="artist_key_title_key_unique")
     print("First plays collection index created")
+except Exception as e:
+    print(f"Index creation error (probably already exists): {e}")
+
+try:
+    collection.create_index(
+        [("artist_key", 1), ("title_key", 1), ("timestamp", 1)],
+        name="artist_key_title_key_timestamp"
+    )
+    print("Comedy tracks compound index created")
+except Exception as e:
+    print(f"Index creation error (probably already exists): {e}")
+
+try:
+    # Read order of exports filtered by artist
+    collection.create_index(ARTIST_EXPORT_SORT, name="artist_key_timestamp")
+    print("Comedy tracks export index created")
+except Exception as e:
+    print(f"Index creation error (probably already exists): {e}")
+
+try:
+    email_outbox.ensure_indexes()
+    print("Email outbox collection index created")
+except Exception as e:
+    print(f"Index creation error (probably already exists): {e}")
+
+try:
+    daily_plays_collection.create_index("day")
+    daily_plays_collection.create_index([("artist_key", 1), ("title_key", 1), ("day", 1)])
+    print("Daily plays collection index created")
 except Exception as e:
     print(f"Index creation error (probably already exists): {e}")
\ No newline at end of file
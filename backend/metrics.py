@@ -0,0 +1,147 @@
+"""
+In-process metrics, served by /metrics in the Prometheus text format.
+
+Request latency and response size histograms are filled by an HTTP
+middleware, Mongo command durations by a pymongo CommandListener registered
+on the client, and cache and ingest figures are read when /metrics is
+scraped. Everything lives in this process, so each API worker reports its
+own numbers; Prometheus sums them.
+
+Payload logging goes through log_sampled(), which prints one JSON line for
+a LOG_SAMPLE_RATE fraction of calls instead of every request.
+"""
+
+import os
+import json
+import random
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.05"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def label_text(names: Iterable[str], values: Iterable, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+            for bound, count in zip(bounds, series):
+                lines.append(f"{self.name}_bucket{label_text(self.label_names, labels, bound)} {format_number(count)}")
+            lines.append(f"{self.name}_count{label_text(self.label_names, labels)} {format_number(series[-2])}")
+            lines.append(f"{self.name}_sum{label_text(self.label_names, labels)} {format_number(series[-1])}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{label_text(self.label_names, labels)} {format_number(value)}")
+        return lines
+
+def sampled_metric(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, str], float]], metric_type: str = "gauge") -> List[str]:
+    """Render a metric from (labels, value) samples computed at scrape time."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{label_text(labels.keys(), labels.values())} {format_number(value)}")
+    return lines
+
+REQUEST_LATENCY = Histogram(
+    "sirius_http_request_duration_seconds", "HTTP request latency by route.",
+    ("method", "route", "status"), LATENCY_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "sirius_http_response_size_bytes", "HTTP response body size by route (responses with a Content-Length).",
+    ("method", "route"), SIZE_BUCKETS
+)
+NOT_MODIFIED = Counter("sirius_http_not_modified_total", "Revalidations answered with 304 by route.", ("route",))
+MONGO_COMMAND_DURATION = Histogram(
+    "sirius_mongo_command_duration_seconds", "MongoDB command duration by command and collection.",
+    ("command", "collection", "outcome"), LATENCY_BUCKETS
+)
+
+def command_collection(event) -> str:
+    """Collection a command ran against ("" for database-level commands)."""
+    if event.command_name == "getMore":
+        return str(event.command.get("collection", ""))
+    target = event.command.get(event.command_name)
+    return target if isinstance(target, str) else ""
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the client runs into MONGO_COMMAND_DURATION."""
+
+    def __init__(self, histogram: Histogram = MONGO_COMMAND_DURATION):
+        self.histogram = histogram
+        self._collections: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = command_collection(event)
+
+    def _finished(self, event, outcome):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.histogram.observe((event.command_name, collection, outcome), event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finished(event, "ok")
+
+    def failed(self, event):
+        self._finished(event, "error")
+
+def log_sampled(event: str, **fields):
+    """Print a JSON log line for a LOG_SAMPLE_RATE fraction of calls."""
+    if LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE:
+        print(json.dumps({"event": event, "sampleRate": LOG_SAMPLE_RATE, **fields}, default=str))
@@ -0,0 +1,146 @@
+"""
+Server-side cache for dashboard query responses.
+
+Responses are stored already serialized, in an LRU bounded by total bytes.
+Entries are keyed on the normalized query window plus the current plays and
+catalog versions, so new plays or a catalog sync move every key and stale
+entries simply stop being hit. The same key doubles as the ETag, which lets a
+browser revalidation be answered with a 304 before any query or serialization.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# getTracks.py runs every 30 minutes, so windows ending "now" only change per ingest
+INGEST_INTERVAL = timedelta(seconds=int(os.getenv("INGEST_INTERVAL_SECONDS", "1800")))
+DATA_VERSION_POLL_SECONDS = float(os.getenv("DATA_VERSION_POLL_SECONDS", "5"))
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: Optional[str]
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: CachedResponse) -> CachedResponse:
+        if len(entry.body) > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = entry
+            self.size += len(entry.body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+class DataVersion:
+    """Tracks a {_id, version, updatedAt} document in data_versions, polled at most every poll_seconds.
+
+    scripts/rollups.py bumps the "plays" document whenever plays are written.
+    """
+
+    def __init__(self, collection, doc_id: str, poll_seconds: float = DATA_VERSION_POLL_SECONDS):
+        self.collection = collection
+        self.doc_id = doc_id
+        self.poll_seconds = poll_seconds
+        self.version = None
+        self.updated_at: Optional[datetime] = None
+        self._checked_at = 0.0
+
+    def current(self, force: bool = False):
+        if force or time.monotonic() - self._checked_at >= self.poll_seconds:
+            self._checked_at = time.monotonic()
+            try:
+                doc = self.collection.find_one({"_id": self.doc_id}) or {}
+                self.version = doc.get("version")
+                self.updated_at = doc.get("updatedAt")
+            except PyMongoError as e:
+                print(f"Data version check failed for {self.doc_id}: {e}")
+        return self.version
+
+def bucket_window_end(end_dt: datetime, now: Optional[datetime] = None) -> datetime:
+    """Round an end time inside the current ingest interval up to the interval boundary.
+
+    Plays only arrive once per interval, so every request for "until now" within
+    the same interval sees the same data and can share one cache entry.
+    Historical ends are left alone.
+    """
+    now = now or datetime.now(timezone.utc)
+    if now - end_dt > INGEST_INTERVAL:
+        return end_dt
+    step = INGEST_INTERVAL.total_seconds()
+    epoch = end_dt.timestamp()
+    return datetime.fromtimestamp(-(-epoch // step) * step, tz=timezone.utc)
+
+def cache_key(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+def newest_http_date(*updated_at: Optional[datetime]) -> Optional[str]:
+    """Last-Modified for a response built from several data versions: the newest known updatedAt."""
+    known = [dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc) for dt in updated_at if dt is not None]
+    return http_date(max(known)) if known else None
+
+def http_date(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+def is_not_modified(request_headers, etag: str, last_modified: Optional[str]) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against a response's validators."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
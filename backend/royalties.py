@@ -0,0 +1,128 @@
+"""
+Per-channel royalty rates applied inside the play aggregations.
+
+Each document in royalty_rates gives the per-play Featured Artist and Rights
+Owner royalty for one channel ("*" for any channel) from effectiveFrom until
+effectiveTo (open-ended when null). scripts/royalty_rates.py maintains them,
+by hand or learned from statement CSVs, and bumps data_versions
+{_id: "royalty_rates"} so the API reloads the table.
+
+The table is small, so instead of a $lookup per row it is compiled into a
+$switch on channel and play date that prices every play row. "royalties" in
+API responses are Rights Owner royalties, which is what the dashboard always
+showed; "featuredRoyalties" are reported alongside.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+# Used for plays no rate covers; the owner default is the dashboard's old flat $20 per spin
+DEFAULT_OWNER_RATE = float(os.getenv("ROYALTY_DEFAULT_OWNER_RATE", "20"))
+DEFAULT_FEATURED_RATE = float(os.getenv("ROYALTY_DEFAULT_FEATURED_RATE", "0"))
+ANY_CHANNEL = "*"
+
+@dataclass(frozen=True)
+class RoyaltyRate:
+    channel: str
+    effective_from: datetime
+    effective_to: Optional[datetime]
+    featured_rate: float
+    owner_rate: float
+    manual: bool
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(
+            channel=doc.get("channel") or ANY_CHANNEL,
+            effective_from=doc["effectiveFrom"],
+            effective_to=doc.get("effectiveTo"),
+            featured_rate=float(doc.get("featuredRate") or 0),
+            owner_rate=float(doc.get("ownerRate") or 0),
+            manual=doc.get("source") == "manual"
+        )
+
+@dataclass(frozen=True)
+class RateTable:
+    version: Optional[int]
+    rates: Tuple[RoyaltyRate, ...]
+    # updatedAt of the royalty_rates data version, for Last-Modified
+    updated_at: Optional[datetime] = None
+
+    def rate_expression(self, field: str, default: float):
+        """Aggregation expression for the per-play rate of a row with channel and lastPlayed."""
+        # Manual rates win over learned ones, even a manual "*" rate over a learned
+        # channel rate; then channel rates win over "*", then the most recent period
+        def precedence(rate):
+            return rate.manual, rate.channel != ANY_CHANNEL, rate.effective_from
+
+        by_channel = {}
+        for rate in self.rates:
+            by_channel.setdefault(rate.channel, []).append(rate)
+        manual_any_channel = [rate for rate in by_channel.get(ANY_CHANNEL, []) if rate.manual]
+        by_channel = {
+            channel: sorted(rates if channel == ANY_CHANNEL else rates + manual_any_channel, key=precedence, reverse=True)
+            for channel, rates in by_channel.items()
+        }
+
+        def periods(rates, fallback):
+            if not rates:
+                return fallback
+            branches = []
+            for rate in rates:
+                within = [{"$gte": ["$lastPlayed", rate.effective_from]}]
+                if rate.effective_to is not None:
+                    within.append({"$lt": ["$lastPlayed", rate.effective_to]})
+                branches.append({"case": {"$and": within}, "then": getattr(rate, field)})
+            return {"$switch": {"branches": branches, "default": fallback}}
+
+        any_channel = periods(by_channel.pop(ANY_CHANNEL, []), default)
+        if not by_channel:
+            return any_channel
+        return {
+            "$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$channel", channel]}, "then": periods(rates, any_channel)}
+                    for channel, rates in by_channel.items()
+                ],
+                "default": any_channel
+            }
+        }
+
+    def stage(self):
+        """$set stage pricing rows that carry plays, channel and lastPlayed."""
+        return {
+            "$set": {
+                "royalty": {"$multiply": ["$plays", self.rate_expression("owner_rate", DEFAULT_OWNER_RATE)]},
+                "featuredRoyalty": {"$multiply": ["$plays", self.rate_expression("featured_rate", DEFAULT_FEATURED_RATE)]}
+            }
+        }
+
+class RoyaltyRates:
+    """Holds the current RateTable, reloading it when the royalty_rates data version moves."""
+
+    def __init__(self, collection, data_version):
+        self.collection = collection
+        self.data_version = data_version
+        self._table: Optional[RateTable] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> RateTable:
+        version = self.data_version.current()
+        if self._table is not None and self._table.version == version:
+            return self._table
+        with self._lock:
+            if self._table is None or self._table.version != version:
+                try:
+                    rates = tuple(RoyaltyRate.from_document(doc) for doc in self.collection.find({}, {"_id": 0}))
+                    self._table = RateTable(version=version, rates=rates, updated_at=self.data_version.updated_at)
+                    print(f"Loaded royalty rates version {version}: {len(rates)} rates")
+                except PyMongoError as e:
+                    print(f"Royalty rate load failed: {e}")
+                    if self._table is None:
+                        self._table = RateTable(version=None, rates=())
+            return self._table
@@ -1,12 +1,21 @@
 import os
+import sys
 import base64
 import json
+import hashlib
 from dotenv import load_dotenv
 import gspread
 from google.oauth2.service_account import Credentials
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DeleteMany, ReturnDocument
 from pathlib import Path
+from datetime import datetime, timezone
+
+# match_keys.py is shared with the ingest scripts: ./scripts in the image, ../scripts in a checkout
+for scripts_dir in (Path(__file__).resolve().parent / "scripts", Path(__file__).resolve().parent.parent / "scripts"):
+    if scripts_dir.is_dir():
+        sys.path.append(str(scripts_dir))
+from match_keys import match_key, title_case
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env", override=True)
 
@@ -50,21 +59,92 @@ df = pd.DataFrame(data)
 # Group by artist and collect tracks in title case
 result = []
 for artist, group in df.groupby("Artist"):
-    tracks = [title.title() for title in group["Title"].tolist()]
+    tracks = [title_case(title) for title in group["Title"].tolist()]
     result.append({"artist": artist, "tracks": tracks})
 
 # Sort artists alphabetically for consistency
 result = sorted(result, key=lambda x: x["artist"])
 
+def catalog_hash(catalog):
+    """Stable fingerprint of a catalog, stored with its version."""
+    return hashlib.sha256(json.dumps(catalog, sort_keys=True).encode("utf-8")).hexdigest()
+
+def track_pairs(catalog):
+    return {(item["artist"], track) for item in catalog for track in item["tracks"]}
+
+def sync_catalog(db, catalog):
+    """Apply only what changed between the stored catalog and `catalog`.
+
+    Artists are upserted or deleted one by one in a single bulk write, so the
+    collection is never empty mid-sync; each carries artist_key and track_keys
+    for matching plays. The catalog version is bumped only when
+    something changed, together with the new hash and a catalog_changes entry
+    listing the added and removed tracks.
+    """
+    collection = db["tracked_artists"]
+    meta = db["catalog_meta"]
+    new_hash = catalog_hash(catalog)
+    stored_meta = meta.find_one({"_id": "tracked_artists"}) or {}
+
+    stored = list(collection.find({}, {"_id": 0, "artist": 1, "tracks": 1, "artist_key": 1, "track_keys": 1}).sort("artist", 1))
+    stored_fields = {item["artist"]: {key: value for key, value in item.items() if key != "artist"} for item in stored}
+    wanted_fields = {
+        item["artist"]: {
+            "tracks": item["tracks"],
+            "artist_key": match_key(item["artist"]),
+            "track_keys": [match_key(track) for track in item["tracks"]]
+        }
+        for item in catalog
+    }
+
+    operations = [
+        UpdateOne({"artist": artist}, {"$set": fields}, upsert=True)
+        for artist, fields in wanted_fields.items()
+        if stored_fields.get(artist) != fields
+    ]
+    removed_artists = sorted(set(stored_fields) - set(wanted_fields))
+    if removed_artists:
+        operations.append(DeleteMany({"artist": {"$in": removed_artists}}))
+
+    added = sorted(track_pairs(catalog) - track_pairs(stored))
+    removed = sorted(track_pairs(stored) - track_pairs(catalog))
+
+    if not operations and stored_meta.get("hash") == new_hash:
+        return None, added, removed
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    # Bump the catalog version so running API workers reload it
+    updated = meta.find_one_and_update(
+        {"_id": "tracked_artists"},
+        {"$inc": {"version": 1}, "$set": {"hash": new_hash, "updatedAt": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    db["catalog_changes"].insert_one({
+        "version": updated["version"],
+        "hash": new_hash,
+        "changedAt": updated["updatedAt"],
+        "addedTracks": [{"artist": artist, "title": title} for artist, title in added],
+        "removedTracks": [{"artist": artist, "title": title} for artist, title in removed]
+    })
+    return updated["version"], added, removed
+
 # Save to MongoDB
 try:
     mongo_client = MongoClient(mongo_url)
     db = mongo_client["sirius"]
-    collection = db["tracked_artists"]
-    collection.delete_many({})  # Clear existing data
-    collection.insert_many(result)
+    db["tracked_artists"].create_index("artist", unique=True)
+    version, added, removed = sync_catalog(db, result)
+    if version is None:
+        print("Catalog unchanged, nothing to sync.")
+    else:
+        print(f"Catalog synced as version {version}: {len(added)} tracks added, {len(removed)} tracks removed.")
+        for artist, title in added:
+            print(f"  + {artist} - {title}")
+        for artist, title in removed:
+            print(f"  - {artist} - {title}")
     print("Data saved to MongoDB collection 'tracked_artists' in 'sirius' database.")
 except Exception as e:
     print(f"Error saving data to MongoDB: {e}")
     exit(1)
-
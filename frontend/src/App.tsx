@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import jwt_decode from "jwt-decode";
 
 type GoogleJwtPayload = {
@@ -114,7 +114,17 @@ const App: React.FC = () => {
   const [expandedArtist, setExpandedArtist] = useState<string | null>(null);
   const [expandedTrack, setExpandedTrack] = useState<{ artist: string; title: string } | null>(null);
   const [search, setSearch] = useState<string>("");
-  const [previousRoyalties, setPreviousRoyalties] = useState<number | null>(null);
+  const [summary, setSummary] = useState<any | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
+  // Per-artist track breakdowns, fetched the first time an artist is expanded
+  const [breakdowns, setBreakdowns] = useState<Record<string, any>>({});
+  // Bumped by every ranking request and every new ranking; responses tagged
+  // with an older value belong to a superseded window or search and are dropped
+  const rankingRequest = useRef(0);
+  const rankingGeneration = useRef(0);
+  // Same for the header summary: only the latest request may set it
+  const summaryRequest = useRef(0);
 
   // Check for stored authentication on app load
   const checkStoredAuth = () => {
@@ -212,80 +222,87 @@ const App: React.FC = () => {
     return { start: start.toISOString(), end: end.toISOString() };
   };
 
-  const fetchData = async () => {
-    setLoading(true);
+  const selectedRange = (): { start: string; end: string } | null => {
+    if (period === 'custom') {
+      return customStart && customEnd
+        ? { start: new Date(customStart).toISOString(), end: new Date(customEnd).toISOString() }
+        : null;
+    }
+    return getDateRange(period);
+  };
+
+  // Ranked artists arrive a page at a time; pass the previous page's cursor to append the next one
+  const fetchData = async (cursor: string | null = null) => {
+    const range = selectedRange();
+    if (!range) {
+      return;
+    }
+    const requestId = ++rankingRequest.current;
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
+      rankingGeneration.current += 1;
+      setLoading(true);
+      setBreakdowns({});
+      setExpandedArtist(null);
+    }
     setError(null);
     try {
-      let start: string, end: string;
-      if (period === 'custom') {
-        if (!customStart || !customEnd) {
-          setLoading(false);
-          return;
-        }
-        start = new Date(customStart).toISOString();
-        end = new Date(customEnd).toISOString();
-      } else {
-        ({ start, end } = getDateRange(period));
-      }
-      const params = new URLSearchParams({ start, end });
-      const response = await fetch(`/api/artist-plays?${params}`);
+      const params = new URLSearchParams(range);
+      if (search.trim()) params.set('q', search.trim());
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`/api/artists?${params}`);
       const result = await response.json();
+      if (requestId !== rankingRequest.current) return;
       if (result.error) {
         setError(result.error);
-        setData([]);
+        if (!cursor) setData([]);
+        setNextCursor(null);
       } else {
-        const enrichedData = result.data.map((artist: any) => {
-          // For each track, group by title, then by channel, and track last played
-          const trackBreakdown: Record<
-            string,
-            { count: number; channels: { name: string; lastPlayed: string | null }[] }
-          > = {};
-
-          artist.tracks.forEach((track: any) => {
-            if (!trackBreakdown[track.title]) {
-              trackBreakdown[track.title] = { count: 0, channels: [] };
-            }
-            trackBreakdown[track.title].count += track.plays ?? 1;
-
-            // Find or add channel entry
-            let channelEntry = trackBreakdown[track.title].channels.find(
-              (c) => c.name === track.channel
-            );
-            // Optional debug logging
-            // console.log("channelEntry before:", channelEntry);
-            // console.log("track.timestamp:", track.timestamp);
-
-            if (!channelEntry) {
-              trackBreakdown[track.title].channels.push({
-                name: track.channel,
-                lastPlayed: track.timestamp || null,
-              });
-            } else {
-              if (
-                !channelEntry.lastPlayed ||
-                (track.timestamp && new Date(track.timestamp) > new Date(channelEntry.lastPlayed))
-              ) {
-                channelEntry.lastPlayed = track.timestamp;
-              }
-            }
-          });
-
-          return { ...artist, trackBreakdown };
-        });
-        setData(enrichedData);
+        setData(previous => (cursor ? [...previous, ...result.data] : result.data));
+        setNextCursor(result.nextCursor);
       }
     } catch (err) {
+      if (requestId !== rankingRequest.current) return;
       setError('Failed to fetch data');
-      setData([]);
+      if (!cursor) setData([]);
+      setNextCursor(null);
     }
     setLoading(false);
+    setLoadingMore(false);
   };
 
   useEffect(() => {
-    if (isAuthorized) {
-      fetchData();
+    if (!isAuthorized) {
+      return;
     }
-  }, [period, customStart, customEnd, isAuthorized]);
+    // Wait for a pause in typing before searching
+    const timer = setTimeout(() => fetchData(), search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [period, customStart, customEnd, isAuthorized, search]);
+
+  const toggleArtist = async (artist: string) => {
+    if (expandedArtist === artist) {
+      setExpandedArtist(null);
+      return;
+    }
+    setExpandedArtist(artist);
+    const range = selectedRange();
+    if (breakdowns[artist] !== undefined || !range) {
+      return;
+    }
+    const generation = rankingGeneration.current;
+    try {
+      const params = new URLSearchParams(range);
+      const response = await fetch(`/api/artists/${encodeURIComponent(artist)}/breakdown?${params}`);
+      const result = await response.json();
+      if (generation !== rankingGeneration.current) return;
+      setBreakdowns(previous => ({ ...previous, [artist]: result.error ? null : result.data }));
+    } catch (err) {
+      if (generation !== rankingGeneration.current) return;
+      setBreakdowns(previous => ({ ...previous, [artist]: null }));
+    }
+  };
 
   // Check for stored authentication on component mount
   useEffect(() => {
@@ -384,22 +401,31 @@ const App: React.FC = () => {
     }
   }, [isAuthorized]);
 
-  // Filter data by search string
-  const filteredData = search.trim()
-    ? data.filter(artist =>
-        artist.artist.toLowerCase().includes(search.trim().toLowerCase())
-      )
-    : data;
-
-  // Update summary numbers based on filtered data
-  const totalSpins = filteredData.reduce((sum, artist) => sum + artist.count, 0);
-  const totalRoyalties = filteredData.reduce((sum, artist) => sum + (artist.count * 20), 0);
-  const totalArtists = filteredData.length;
+  // /api/artists applies the search itself; the summary is filtered here
+  const matchesSearch = (artist: any) =>
+    artist.artist.toLowerCase().includes(search.trim().toLowerCase());
+  // Summary numbers come from /api/summary; with a search term they are re-totalled
+  // from its per-artist current/previous counts
+  const summaryArtists: any[] = summary ? summary.artists : [];
+  const searchedArtists = search.trim() ? summaryArtists.filter(matchesSearch) : summaryArtists;
+  const totalSpins = search.trim()
+    ? searchedArtists.reduce((sum: number, artist: any) => sum + artist.count, 0)
+    : (summary ? summary.current.spins : 0);
+  const totalRoyalties = search.trim()
+    ? searchedArtists.reduce((sum: number, artist: any) => sum + artist.royalties, 0)
+    : (summary ? summary.current.royalties : 0);
+  const totalArtists = search.trim()
+    ? searchedArtists.filter((artist: any) => artist.count > 0).length
+    : (summary ? summary.current.artists : 0);
 
   // Calculate percentage change
+  let change: number | null = summary ? summary.percentChange : null;
+  if (search.trim()) {
+    const previousRoyalties = searchedArtists.reduce((sum: number, artist: any) => sum + artist.previousRoyalties, 0);
+    change = previousRoyalties !== 0 ? ((totalRoyalties - previousRoyalties) / previousRoyalties) * 100 : null;
+  }
   let percentChange: string | null = null;
-  if (previousRoyalties !== null && previousRoyalties !== 0 && period !== 'all') {
-    const change = ((totalRoyalties - previousRoyalties) / previousRoyalties) * 100;
+  if (change !== null && period !== 'all') {
     percentChange = `${change > 0 ? '+' : ''}${change.toFixed(1)}%`;
   }
 
@@ -409,33 +435,34 @@ const App: React.FC = () => {
   };
 
   useEffect(() => {
-    // Fetch previous period royalties
+    // Fetch the header numbers and the previous period comparison in one request
+    const range = selectedRange();
+    const requestId = ++summaryRequest.current;
+    if (!range || !isAuthorized) {
+      setSummary(null);
+      return;
+    }
     const prevRange = period === 'custom'
       ? getCustomPreviousDateRange(customStart, customEnd)
       : getPreviousDateRange(period);
-    if (!prevRange) {
-      setPreviousRoyalties(null);
-      return;
-    }
-    const fetchPrev = async () => {
-      const params = new URLSearchParams(prevRange);
-      const response = await fetch(`/api/artist-plays?${params}`);
-      const result = await response.json();
-      if (result.data) {
-        // Filter previous period data by search string, just like filteredData
-        const filteredPrev = search.trim()
-          ? result.data.filter((artist: any) =>
-              artist.artist.toLowerCase().includes(search.trim().toLowerCase())
-            )
-          : result.data;
-        const prevRoyalties = filteredPrev.reduce((sum: number, artist: any) => sum + (artist.count * 20), 0);
-        setPreviousRoyalties(prevRoyalties);
-      } else {
-        setPreviousRoyalties(null);
+    const fetchSummary = async () => {
+      try {
+        const params = new URLSearchParams(range!);
+        if (prevRange) {
+          params.set('prev_start', prevRange.start);
+          params.set('prev_end', prevRange.end);
+        }
+        const response = await fetch(`/api/summary?${params}`);
+        const result = await response.json();
+        if (requestId !== summaryRequest.current) return;
+        setSummary(result.data ? result.data : null);
+      } catch (err) {
+        if (requestId !== summaryRequest.current) return;
+        setSummary(null);
       }
     };
-    fetchPrev();
-  }, [period, customStart, customEnd, search]);
+    fetchSummary();
+  }, [period, customStart, customEnd, isAuthorized]);
 
   if (!isAuthorized) {
     return (
@@ -522,7 +549,7 @@ const App: React.FC = () => {
       <div className="grid grid-cols-3 gap-0 mb-2 text-white font-semibold bg-gradient-to-r from-blue-500 to-purple-600 p-2 rounded-t-lg">
         <div className="text-center">Total Artists: {totalArtists}</div>
         <div className="text-center">Total Spins: {totalSpins.toLocaleString()}</div>
-        <div className="text-center">Total Royalties: ${totalRoyalties.toLocaleString()}</div>
+        <div className="text-center">Total Royalties: ${totalRoyalties.toLocaleString(undefined, { maximumFractionDigits: 2 })}</div>
       </div>
       {error && (
         <div className="mb-4 p-4 bg-red-100 text-red-700 rounded-md">
@@ -531,7 +558,7 @@ const App: React.FC = () => {
       )}
       {loading ? (
         <div className="text-center text-gray-600">Loading...</div>
-      ) : filteredData.length > 0 ? (
+      ) : data.length > 0 ? (
         <div className="overflow-x-auto">
           <table className="w-full table-fixed border-collapse">
             <thead>
@@ -542,11 +569,11 @@ const App: React.FC = () => {
               </tr>
             </thead>
             <tbody>
-              {filteredData.map((artist, index) => (
+              {data.map((artist, index) => (
                 <React.Fragment key={index}>
                   <tr
                     className="cursor-pointer hover:bg-gray-100 transition"
-                    onClick={() => setExpandedArtist(expandedArtist === artist.artist ? null : artist.artist)}
+                    onClick={() => toggleArtist(artist.artist)}
                   >
                     <td className="px-4 py-2 font-medium flex items-center gap-2">
                       <span
@@ -559,14 +586,19 @@ const App: React.FC = () => {
                       {artist.artist}
                     </td>
                     <td className="px-4 py-2 text-blue-600 underline">{artist.count}</td>
-                    <td className="px-4 py-2">${(artist.count * 20).toLocaleString()}</td>
+                    <td className="px-4 py-2">${artist.royalties.toLocaleString(undefined, { maximumFractionDigits: 2 })}</td>
                   </tr>
                   {expandedArtist === artist.artist && (
                     <tr className="bg-gradient-to-r from-blue-50 to-purple-50 transition-all duration-500 ease-in-out">
                       <td colSpan={3} className="px-6 py-4">
                         <div className="overflow-hidden max-h-[500px]">
+                          {breakdowns[artist.artist] === undefined ? (
+                            <div className="text-gray-500">Loading tracks...</div>
+                          ) : breakdowns[artist.artist] === null ? (
+                            <div className="text-gray-400">No track data</div>
+                          ) : (
                           <ul className="divide-y divide-purple-100">
-                            {Object.entries(artist.trackBreakdown).map(([title, info]) => {
+                            {Object.entries(breakdowns[artist.artist].trackBreakdown).map(([title, info]) => {
                               const trackInfo = info as { count: number; channels: { name: string; lastPlayed: string | null }[] };
                               // Find the most recent lastPlayed timestamp across all channels for this track
                               const latestLastPlayed = trackInfo.channels.reduce((latest: string | null, channel) => {
@@ -621,6 +653,7 @@ const App: React.FC = () => {
                               );
                             })}
                           </ul>
+                          )}
                         </div>
                       </td>
                     </tr>
@@ -629,6 +662,17 @@ const App: React.FC = () => {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="text-center mt-4">
+              <button
+                onClick={() => fetchData(nextCursor)}
+                className="p-2 bg-blue-500 text-white rounded disabled:opacity-50"
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       ) : (
         <div className="text-center text-gray-600">No data available</div>
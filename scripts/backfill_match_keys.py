@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Store canonical match keys (see match_keys.py) on documents written before
+they existed, and create the plain indexes the API matches them with (dropping
+the collated artist/title index they replace).
+
+Walks comedy_tracks, daily_plays and first_plays (artist_key/title_key) and
+tracked_artists (artist_key/track_keys) in _id order, one bulk write per
+batch, writing only keys that differ. Progress is checkpointed in
+sirius -> migrations, so an interrupted run resumes; --restart walks
+everything again, e.g. after the key rules changed. First plays of songs
+whose spellings collapse onto the same keys are reduced to the earliest one
+before the unique key index is built.
+
+Usage:
+    python backfill_match_keys.py [--batch-size 5000] [--restart]
+"""
+
+import os
+import sys
+import argparse
+import logging
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from match_keys import match_key, play_keys
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('backfill_match_keys.log')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+def catalog_keys(doc):
+    return {"artist_key": match_key(doc.get("artist")), "track_keys": [match_key(track) for track in doc.get("tracks", [])]}
+
+def document_keys(doc):
+    return play_keys(doc.get("artist"), doc.get("title"))
+
+# Collection, source fields, key builder
+TARGETS = [
+    ("comedy_tracks", ["artist", "title", "artist_key", "title_key"], document_keys),
+    ("daily_plays", ["artist", "title", "artist_key", "title_key"], document_keys),
+    ("first_plays", ["artist", "title", "artist_key", "title_key"], document_keys),
+    ("tracked_artists", ["artist", "tracks", "artist_key", "track_keys"], catalog_keys),
+]
+
+def backfill_collection(db, collection_name, fields, build_keys, batch_size, restart=False):
+    collection = db[collection_name]
+    checkpoints = db["migrations"]
+    checkpoint_id = f"match_keys:{collection_name}"
+    if restart:
+        checkpoints.delete_one({"_id": checkpoint_id})
+    last_id = (checkpoints.find_one({"_id": checkpoint_id}) or {}).get("lastId")
+
+    updated = 0
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(collection.find(query, {field: 1 for field in fields}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            keys = build_keys(doc)
+            if any(doc.get(field) != value for field, value in keys.items()):
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": keys}))
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"lastId": last_id}}, upsert=True)
+        logger.info(f"[{collection_name}] Updated {updated:,} so far")
+
+    logger.info(f"✅ [{collection_name}] Done, {updated:,} documents updated")
+    return updated
+
+# Case-insensitive (artist, title, timestamp) index from before match keys; no query uses it any more
+LEGACY_PLAYS_INDEX = "artist_title_timestamp_ci"
+
+def ensure_indexes(db):
+    if LEGACY_PLAYS_INDEX in db["comedy_tracks"].index_information():
+        db["comedy_tracks"].drop_index(LEGACY_PLAYS_INDEX)
+        logger.info(f"Dropped unused index {LEGACY_PLAYS_INDEX}")
+    db["comedy_tracks"].create_index(
+        [("artist_key", 1), ("title_key", 1), ("timestamp", 1)],
+        name="artist_key_title_key_timestamp"
+    )
+    db["comedy_tracks"].create_index([("artist_key", 1), ("timestamp", 1), ("_id", 1)], name="artist_key_timestamp")
+    db["daily_plays"].create_index([("artist_key", 1), ("title_key", 1), ("day", 1)])
+    db["first_plays"].create_index([("artist_key", 1), ("title_key", 1)], unique=True, name="artist_key_title_key_unique")
+    logger.info("Match key indexes created")
+
+def dedupe_first_plays(db):
+    """Keep only the earliest first play of songs whose spellings now share match keys."""
+    pipeline = [
+        {"$sort": {"timestamp": 1, "_id": 1}},
+        {"$group": {"_id": {"artist_key": "$artist_key", "title_key": "$title_key"}, "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}}
+    ]
+    duplicate_ids = [doc_id for group in db["first_plays"].aggregate(pipeline, allowDiskUse=True) for doc_id in group["ids"][1:]]
+    if duplicate_ids:
+        db["first_plays"].delete_many({"_id": {"$in": duplicate_ids}})
+    logger.info(f"Removed {len(duplicate_ids):,} duplicate first plays")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Store canonical artist/title match keys on existing documents")
+    arg_parser.add_argument("--batch-size", type=int, default=5000)
+    arg_parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and recompute every document")
+    args = arg_parser.parse_args()
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
+    try:
+        db = client["sirius"]
+        for collection_name, fields, build_keys in TARGETS:
+            backfill_collection(db, collection_name, fields, build_keys, args.batch_size, args.restart)
+        dedupe_first_plays(db)
+        ensure_indexes(db)
+        logger.info("Backfill completed successfully")
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Backfill interrupted, re-run to resume")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"❌ Backfill failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dashboard queries and the ingest paths against a local mongod.
+
+Runs each benchmark for --rounds timed rounds (after one warm-up round) and
+reports p50/p95 latency, throughput (rows or plays per second) and the peak
+Python memory of one extra round under tracemalloc:
+
+    artist_plays:*       main.query_artist_plays for both views over 30 and 365 days
+    summary:30d          main.query_summary with its previous-period comparison
+    first_plays:check    main.check_and_record_first_plays on a batch of new plays
+    fetch_and_store      getTracks.fetch_and_store against an in-process stand-in
+                         for the playlist API serving fresh plays for every station
+    rollups:rebuild:30d  rollups.rebuild_rollups for the last 30 days
+
+The API's response cache is bypassed: the query functions are called
+directly. Everything runs against the "sirius" database of --mongo-uri,
+which must be a local server, since the benchmarks write plays and first
+plays; fill it with synthetic_data.py first (or pass --generate).
+
+With --baseline the results are compared to a stored run and the exit status
+is 1 if any p95 latency or peak memory grew by more than --tolerance;
+--save-baseline stores this run instead.
+
+Usage:
+    python benchmark.py [--mongo-uri mongodb://localhost:27017] [--generate --scale 10] [--rounds 20]
+                        [--only artist_plays] [--baseline benchmark_baseline.json [--save-baseline]]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import threading
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+DEFAULT_TOLERANCE = 0.25
+# Latency changes below this are noise, whatever the ratio
+MIN_REGRESSION_MS = 5.0
+FIRST_PLAY_BATCH = 500
+STATION_RESULTS = 100
+
+@dataclass
+class Benchmark:
+    name: str
+    # Runs one round and returns how many rows or plays it handled
+    run: Callable[[], int]
+    setup: Optional[Callable[[], None]] = None
+    rounds: Optional[int] = None
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def measure(benchmark, rounds):
+    """Time a benchmark; returns its p50/p95 latency, throughput and peak traced memory."""
+    rounds = benchmark.rounds or rounds
+    if benchmark.setup:
+        benchmark.setup()
+    benchmark.run()
+
+    timings, items = [], 0
+    for _ in range(rounds):
+        if benchmark.setup:
+            benchmark.setup()
+        started = time.perf_counter()
+        items += benchmark.run()
+        timings.append(time.perf_counter() - started)
+
+    # Memory is measured on a separate round; tracing slows everything down
+    if benchmark.setup:
+        benchmark.setup()
+    tracemalloc.start()
+    try:
+        benchmark.run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+        "throughput_per_s": round(items / sum(timings), 1) if sum(timings) else 0.0,
+        "peak_memory_mb": round(peak / 2 ** 20, 2),
+        "rounds": rounds
+    }
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Describe every benchmark whose p95 latency or peak memory grew beyond the tolerance."""
+    found = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance) and result["p95_ms"] - before["p95_ms"] >= MIN_REGRESSION_MS:
+            found.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["peak_memory_mb"] > before["peak_memory_mb"] * (1 + tolerance) and result["peak_memory_mb"] - before["peak_memory_mb"] >= 1:
+            found.append(f"{name}: peak memory {before['peak_memory_mb']}MB -> {result['peak_memory_mb']}MB")
+    return found
+
+class StationServer:
+    """Stand-in for the playlist API: serves queued payloads per station from a background thread."""
+
+    def __init__(self):
+        self.payloads = {}
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def start(self):
+        from aiohttp import web
+
+        async def station(request):
+            return web.json_response(self.payloads.get(request.match_info["name"], {"channel": {"name": ""}, "results": []}))
+
+        async def ingest_plays(request):
+            # getTracks.py posts new plays here instead of to a running API
+            plays = await request.json()
+            return web.json_response({"status": "success", "processed": len(plays)})
+
+        async def serve():
+            app = web.Application()
+            app.router.add_get("/{name}", station)
+            app.router.add_post("/api/ingest-plays", ingest_plays)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            return runner.addresses[0][1]
+
+        threading.Thread(target=self.loop.run_forever, name="station-server", daemon=True).start()
+        self.port = asyncio.run_coroutine_threadsafe(serve(), self.loop).result()
+        return f"http://127.0.0.1:{self.port}/"
+
+def build_benchmarks(db, station_server):
+    # Imported here: both modules connect to MONGO_URI when imported
+    import getTracks
+    import rollups
+    sys.path.append(str(BACKEND_DIR))
+    import main
+
+    catalog, rates, _ = main.current_data_versions(force=True)
+    now = datetime.now(main.EASTERN)
+    rng = random.Random(11)
+    tracked = sorted(catalog.pairs)
+    stations = list(db["tracked_stations"].find({}, {"_id": 0, "name": 1}))
+    clock = {"timestamp": datetime.now(timezone.utc)}
+
+    def artist_plays(view, days):
+        return lambda: len(main.query_artist_plays(catalog, rates, now - timedelta(days=days), now, view))
+
+    def summary():
+        start = now - timedelta(days=30)
+        main.query_summary(catalog, rates, start, now, start - timedelta(days=30), start)
+        return 1
+
+    def new_plays(count):
+        """Plays of tracked tracks newer than anything stored so far."""
+        plays = []
+        for _ in range(count):
+            clock["timestamp"] += timedelta(seconds=1)
+            artist, title = rng.choice(tracked)
+            plays.append({"id": f"bench-{rng.getrandbits(64):x}", "artist": artist, "title": title,
+                          "channel": "Benchmark", "timestamp": clock["timestamp"]})
+        return plays
+
+    first_play_batch = {}
+
+    def prepare_first_plays():
+        first_play_batch["plays"] = [
+            {**play, "timestamp": play["timestamp"].isoformat()} for play in new_plays(FIRST_PLAY_BATCH)
+        ]
+        db["first_plays"].delete_many({"channel": "Benchmark"})
+
+    def check_first_plays():
+        main.check_and_record_first_plays(first_play_batch["plays"])
+        return len(first_play_batch["plays"])
+
+    def prepare_stations():
+        for station in stations:
+            station_server.payloads[station["name"]] = {
+                "channel": {"name": station["name"]},
+                "results": [
+                    {"id": play["id"], "timestamp": play["timestamp"].isoformat(),
+                     "track": {"title": play["title"], "artists": [play["artist"]]}}
+                    for play in new_plays(STATION_RESULTS)
+                ]
+            }
+
+    def fetch_and_store():
+        getTracks.fetch_and_store()
+        return len(stations) * STATION_RESULTS
+
+    def rebuild_rollups():
+        rollups.rebuild_rollups(db, since=(now - timedelta(days=30)).date().isoformat())
+        return 1
+
+    return [
+        Benchmark("artist_plays:plays:30d", artist_plays("plays", 30)),
+        Benchmark("artist_plays:plays:365d", artist_plays("plays", 365)),
+        Benchmark("artist_plays:breakdown:30d", artist_plays("breakdown", 30)),
+        Benchmark("artist_plays:breakdown:365d", artist_plays("breakdown", 365)),
+        Benchmark("summary:30d", summary),
+        Benchmark("first_plays:check", check_first_plays, setup=prepare_first_plays),
+        Benchmark("fetch_and_store", fetch_and_store, setup=prepare_stations, rounds=5),
+        Benchmark("rollups:rebuild:30d", rebuild_rollups, rounds=3),
+    ]
+
+def cleanup(db):
+    """Remove what the ingest benchmarks wrote, so the dataset stays the generated one.
+
+    Benchmark plays are stored under the station names as channels, which the
+    generated plays never use, so their rollup buckets can be told apart.
+    """
+    station_names = [station["name"] for station in db["tracked_stations"].find({}, {"name": 1})]
+    db["comedy_tracks"].delete_many({"id": {"$regex": "^bench-"}})
+    db["daily_plays"].delete_many({"channel": {"$in": station_names}})
+    db["first_plays"].delete_many({"channel": "Benchmark"})
+    db["email_outbox"].delete_many({"channel": "Benchmark"})
+    db["tracked_stations"].update_many({}, {"$unset": {"cursor": "", "etag": "", "lastModified": ""}})
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    arg_parser = argparse.ArgumentParser(description="Benchmark dashboard queries and ingest against a local mongod")
+    arg_parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    arg_parser.add_argument("--generate", action="store_true", help="Regenerate the synthetic dataset first")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="Dataset scale for --generate")
+    arg_parser.add_argument("--rounds", type=int, default=20)
+    arg_parser.add_argument("--only", help="Only run benchmarks whose name starts with this")
+    arg_parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline instead of comparing")
+    arg_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed growth before a regression fails the run")
+    arg_parser.add_argument("--output", help="Also write this run's results as JSON here")
+    args = arg_parser.parse_args()
+
+    from pymongo import MongoClient
+    import synthetic_data
+
+    if not synthetic_data.is_local(args.mongo_uri):
+        logger.error("Benchmarks write to the database; use a local server")
+        sys.exit(1)
+
+    station_server = StationServer()
+    # getTracks.py and main.py read these when imported
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["MONGO_TLS"] = "false"
+    os.environ["XMPLAYLIST_BASE_URL"] = station_server.start()
+    os.environ["FIRST_PLAY_URL"] = f"{os.environ['XMPLAYLIST_BASE_URL']}api/ingest-plays"
+
+    client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=30000, tz_aware=True)
+    db = client[synthetic_data.DATABASE]
+    try:
+        if args.generate:
+            synthetic_data.generate(db, scale=args.scale, drop=True)
+        plays = db["comedy_tracks"].estimated_document_count()
+        if not plays:
+            logger.error("No plays in the database; run synthetic_data.py or pass --generate")
+            sys.exit(1)
+
+        benchmarks = build_benchmarks(db, station_server)
+        # Per-play ingest logging would drown the report
+        logging.getLogger("getTracks").setLevel(logging.WARNING)
+
+        results = {}
+        try:
+            for benchmark in benchmarks:
+                if args.only and not benchmark.name.startswith(args.only):
+                    continue
+                results[benchmark.name] = measure(benchmark, args.rounds)
+                result = results[benchmark.name]
+                print(f"{benchmark.name:<30} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                      f"{result['throughput_per_s']:>11,.1f}/s  peak {result['peak_memory_mb']:>7.2f}MB")
+        finally:
+            cleanup(db)
+
+        run = {"plays": plays, "recordedAt": datetime.now(timezone.utc).isoformat(), "results": results}
+        if args.output:
+            Path(args.output).write_text(json.dumps(run, indent=2))
+
+        if args.baseline and args.save_baseline:
+            Path(args.baseline).write_text(json.dumps(run, indent=2))
+            logger.info(f"Baseline saved to {args.baseline}")
+        elif args.baseline:
+            baseline = json.loads(Path(args.baseline).read_text())
+            if baseline.get("plays") != plays:
+                logger.warning(f"Baseline was recorded on {baseline.get('plays'):,} plays, this run has {plays:,}")
+            found = regressions(results, baseline, args.tolerance)
+            for regression in found:
+                logger.error(f"❌ Regression: {regression}")
+            if found:
+                sys.exit(1)
+            logger.info(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    finally:
+        client.close()
@@ -1,17 +1,32 @@
 #!/usr/bin/env python3
 """
-Export all data from MongoDB comedy_tracks collection to CSV file.
-This script downloads all records from Cluster0 -> sirius -> comedy_tracks
-and saves them to a CSV file for ML training purposes.
+Export plays from MongoDB comedy_tracks through the API's streaming export.
+
+The API reads the collection in _id order with a server-side projection and
+large cursor batches and streams CSV, NDJSON or Parquet back; this script
+writes the stream straight to disk, so memory stays flat for any export size.
+Every row carries its _id, and --resume continues a CSV/NDJSON file from the
+last _id it contains.
+
+Usage:
+    python export_comedy_tracks.py
+    python export_comedy_tracks.py --format parquet --start 2025-01-01 --end 2025-02-01
+    python export_comedy_tracks.py --artist "Sean Patton" --channel "Comedy Central Radio" -o sean.csv
+    python export_comedy_tracks.py -o comedy_tracks.ndjson --format ndjson --resume
+
+Authenticates with EXPORT_API_KEY (sent as a bearer token) against
+EXPORT_API_URL, which defaults to the production dashboard.
 """
 
 import os
 import sys
 import csv
+import json
 import logging
-from pymongo import MongoClient
-from dotenv import load_dotenv
+import argparse
 from datetime import datetime
+import requests
+from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
@@ -27,89 +42,121 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# MongoDB setup
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    logger.error("MONGO_URI not set in environment variables")
-    sys.exit(1)
+EXPORT_API_URL = os.getenv("EXPORT_API_URL", "https://xm.setupcomedy.com")
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
 
-# Output file configuration
-OUTPUT_FILE = f"comedy_tracks_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_EVERY_BYTES = 50 * 1024 * 1024
 
-def export_to_csv():
-    """Export all comedy_tracks data to CSV file."""
-    
-    logger.info("Connecting to MongoDB...")
-    try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
-        client.server_info()  # Test connection
-        db = client["sirius"]
-        collection = db["comedy_tracks"]
-        logger.info("✅ Connected to MongoDB successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to connect to MongoDB: {e}")
-        sys.exit(1)
-    
-    try:
-        # Count total records
-        total_records = collection.count_documents({})
-        logger.info(f"Total records to export: {total_records:,}")
-        
-        if total_records == 0:
-            logger.warning("No records found in collection")
-            client.close()
-            return
-        
-        # Define CSV headers based on document structure
-        headers = ["id", "timestamp", "title", "artist", "channel"]
-        
-        # Open CSV file for writing
-        logger.info(f"Writing data to {OUTPUT_FILE}...")
-        with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=headers, extrasaction='ignore')
-            writer.writeheader()
-            
-            # Fetch and write records in batches for memory efficiency
-            batch_size = 10000
-            records_written = 0
-            
-            for doc in collection.find({}, {"_id": 0}):  # Exclude MongoDB's _id field
-                # Write the document directly (DictWriter handles the field mapping)
-                writer.writerow(doc)
-                records_written += 1
-                
-                # Log progress every batch_size records
-                if records_written % batch_size == 0:
-                    logger.info(f"Progress: {records_written:,} / {total_records:,} records written ({(records_written/total_records)*100:.1f}%)")
-        
-        logger.info(f"✅ Export completed successfully!")
-        logger.info(f"📁 Output file: {OUTPUT_FILE}")
-        logger.info(f"📊 Total records exported: {records_written:,}")
-        
-        # Display file size
-        file_size_bytes = os.path.getsize(OUTPUT_FILE)
-        file_size_mb = file_size_bytes / (1024 * 1024)
-        logger.info(f"💾 File size: {file_size_mb:.2f} MB")
-        
-    except Exception as e:
-        logger.error(f"❌ Error during export: {e}")
-        sys.exit(1)
-    finally:
-        client.close()
-        logger.info("MongoDB connection closed")
+def last_exported_id(path, fmt):
+    """Return the _id on the last complete line of a CSV/NDJSON export, or None."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        # Rows are short; the last 64KB always holds the final complete line
+        f.seek(max(0, size - 65536))
+        lines = f.read().decode('utf-8', errors='ignore').splitlines(keepends=True)
+    complete = [line for line in lines if line.endswith('\n') and line.strip()]
+    if not complete:
+        return None
+    last = complete[-1]
+    if fmt == 'ndjson':
+        return json.loads(last)["_id"]
+    row = next(csv.reader([last]))
+    return None if row and row[0] == "_id" else row[0]
+
+def truncate_partial_line(path):
+    """Drop a trailing line cut off by an interrupted download."""
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        if tail and not tail.endswith(b'\n'):
+            f.truncate(size - (len(tail) - tail.rfind(b'\n') - 1))
+
+def export(args):
+    output = args.output or f"comedy_tracks_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{args.format}"
+    params = {"format": args.format}
+    if args.start:
+        params["start"] = args.start
+    if args.end:
+        params["end"] = args.end
+    if args.artist:
+        params["artist"] = args.artist
+    if args.channel:
+        params["channel"] = args.channel
+
+    after = args.after
+    mode = 'wb'
+    if args.resume and os.path.exists(output) and os.path.getsize(output) > 0:
+        if args.format == 'parquet':
+            logger.error("Parquet files can't be appended to; pass --after with a new --output instead")
+            sys.exit(1)
+        truncate_partial_line(output)
+        after = last_exported_id(output, args.format) or after
+        mode = 'ab'
+        logger.info(f"Resuming {output} after _id {after}")
+    if after:
+        params["after"] = after
+
+    url = f"{args.api.rstrip('/')}/api/export/plays"
+    headers = {"Authorization": f"Bearer {EXPORT_API_KEY}"}
+    logger.info(f"Streaming {args.format} export from {url} to {output}...")
+
+    with requests.get(url, params=params, headers=headers, stream=True, timeout=(10, 300)) as resp:
+        if resp.status_code != 200:
+            logger.error(f"❌ Export request failed ({resp.status_code}): {resp.text[:500]}")
+            sys.exit(1)
+
+        bytes_written = 0
+        next_progress = PROGRESS_EVERY_BYTES
+        skip_header = mode == 'ab' and args.format == 'csv'
+        with open(output, mode) as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                if skip_header:
+                    # Appending to an existing CSV; the API starts every response with a header row
+                    newline = chunk.find(b'\n')
+                    if newline == -1:
+                        continue
+                    chunk = chunk[newline + 1:]
+                    skip_header = False
+                f.write(chunk)
+                bytes_written += len(chunk)
+                if bytes_written >= next_progress:
+                    logger.info(f"Progress: {bytes_written / (1024 * 1024):,.0f} MB written")
+                    next_progress += PROGRESS_EVERY_BYTES
+
+    logger.info(f"✅ Export completed successfully!")
+    logger.info(f"📁 Output file: {output}")
+    file_size_mb = os.path.getsize(output) / (1024 * 1024)
+    logger.info(f"💾 File size: {file_size_mb:.2f} MB")
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Export comedy_tracks plays through the streaming export API")
+    arg_parser.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    arg_parser.add_argument("--start", help="Only plays at or after this ISO date/time (UTC unless an offset is given)")
+    arg_parser.add_argument("--end", help="Only plays before this ISO date/time")
+    arg_parser.add_argument("--artist", action="append", help="Only this artist (repeatable)")
+    arg_parser.add_argument("--channel", action="append", help="Only this channel (repeatable)")
+    arg_parser.add_argument("--after", help="Start after this _id")
+    arg_parser.add_argument("--resume", action="store_true", help="Continue an existing CSV/NDJSON output file")
+    arg_parser.add_argument("-o", "--output", help="Output file (default: timestamped name in the current directory)")
+    arg_parser.add_argument("--api", default=EXPORT_API_URL, help="API base URL")
+    args = arg_parser.parse_args()
+
+    if not EXPORT_API_KEY:
+        logger.error("EXPORT_API_KEY not set in environment variables")
+        sys.exit(1)
+
     logger.info("=" * 60)
-    logger.info("Starting MongoDB comedy_tracks export to CSV")
+    logger.info("Starting comedy_tracks export")
     logger.info("=" * 60)
-    
+
     try:
-        export_to_csv()
-        logger.info("=" * 60)
-        logger.info("Export script completed successfully")
-        logger.info("=" * 60)
+        export(args)
     except KeyboardInterrupt:
-        logger.warning("\n⚠️  Export interrupted by user")
+        logger.warning("\n⚠️  Export interrupted by user; rerun with --resume to continue")
         sys.exit(1)
     except Exception as e:
         logger.error(f"❌ Script failed: {e}")
@@ -1,7 +1,6 @@
 import pymongo
-from pymongo import MongoClient
-import requests
-from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from datetime import datetime, timezone
 from dateutil import parser
 import logging
 import sys
@@ -10,6 +9,8 @@ from dotenv import load_dotenv
 import time
 import asyncio
 import aiohttp
+import rollups
+from match_keys import play_keys, title_case
 
 # Load environment variables
 load_dotenv()
@@ -38,12 +39,13 @@ backoff_factors = [5, 10, 20]  # Seconds for each retry attempt
 # Attempt MongoDB connection with retries
 for attempt in range(max_retries):
     try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
+        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000, tz_aware=True)
         # Test connection by accessing server info
         client.server_info()
         db = client["sirius"]
         collection = db["comedy_tracks"]
         stations_collection = db["tracked_stations"]
+        ingest_runs_collection = db["ingest_runs"]
         logger.info("Connected to MongoDB")
         break
     except (pymongo.errors.ConnectionError, pymongo.errors.ServerSelectionTimeoutError) as e:
@@ -72,28 +74,267 @@ for attempt in range(max_retries):
             logger.error("Max retries reached for index creation. Exiting.")
             sys.exit(1)
 
+try:
+    rollups.ensure_indexes(db)
+except pymongo.errors.OperationFailure as e:
+    logger.error(f"Failed to create rollup indexes: {e}")
+
+try:
+    # Keep a month of ingest runs
+    ingest_runs_collection.create_index("finishedAt", expireAfterSeconds=30 * 24 * 3600)
+except pymongo.errors.OperationFailure as e:
+    logger.error(f"Failed to create ingest run index: {e}")
+
 BASE_URL = os.getenv("XMPLAYLIST_BASE_URL", "https://xmplaylist.com/api/station/")
 
-async def check_first_plays(new_tracks):
+# Station polling: how many requests run at once, per-request timeout and retry backoff
+FETCH_CONCURRENCY = int(os.getenv("XMPLAYLIST_CONCURRENCY", "8"))
+FETCH_TIMEOUT = float(os.getenv("XMPLAYLIST_TIMEOUT", "10"))
+FETCH_RETRIES = int(os.getenv("XMPLAYLIST_RETRIES", "3"))
+FETCH_BACKOFF = float(os.getenv("XMPLAYLIST_BACKOFF", "1"))
+FIRST_PLAY_URL = os.getenv("FIRST_PLAY_URL", "http://localhost:8000/api/ingest-plays")
+
+async def check_first_plays(session, new_tracks):
     """Send new tracks to the API for first-play checking"""
     if not new_tracks:
         return
     
+    # Timestamps are stored as dates; send them to the API as ISO strings
+    payload = [{**track, "timestamp": track["timestamp"].isoformat()} for track in new_tracks]
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "http://localhost:8000/api/ingest-plays",
-                json=new_tracks,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"First-play check completed: {result}")
-                else:
-                    logger.error(f"First-play check failed: {response.status}")
+        async with session.post(
+            FIRST_PLAY_URL,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            if response.status == 200:
+                result = await response.json()
+                logger.info(f"First-play check completed: {result}")
+            else:
+                logger.error(f"First-play check failed: {response.status}")
     except Exception as e:
         logger.error(f"Error checking first plays: {e}")
 
+async def fetch_station(session, semaphore, station, headers):
+    """Fetch one station's recent plays, retrying timeouts and server errors with backoff.
+
+    Sends the validators saved from the previous poll so an unchanged playlist
+    comes back as a 304. Returns {"status", "data", "etag", "lastModified",
+    "fetchSeconds"}, or None if the station could not be fetched.
+    """
+    name = station["name"]
+    url = f"{BASE_URL}{name}"
+    request_headers = dict(headers)
+    if station.get("etag"):
+        request_headers["If-None-Match"] = station["etag"]
+    if station.get("lastModified"):
+        request_headers["If-Modified-Since"] = station["lastModified"]
+
+    for attempt in range(FETCH_RETRIES):
+        try:
+            async with semaphore:
+                logger.info(f"Requesting URL: {url}")
+                request_started = time.monotonic()
+                async with session.get(
+                    url,
+                    headers=request_headers,
+                    timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+                ) as response:
+                    if response.status == 304:
+                        return {
+                            "status": 304, "data": None, "etag": station.get("etag"), "lastModified": station.get("lastModified"),
+                            "fetchSeconds": time.monotonic() - request_started
+                        }
+                    response.raise_for_status()
+                    data = await response.json()
+                    return {
+                        "status": response.status,
+                        "data": data,
+                        "etag": response.headers.get("ETag"),
+                        "lastModified": response.headers.get("Last-Modified"),
+                        "fetchSeconds": time.monotonic() - request_started
+                    }
+        except aiohttp.ClientResponseError as e:
+            if e.status != 429 and e.status < 500:
+                logger.error(f"[{name}] Request error: {e}")
+                return None
+            error = e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = e
+
+        if attempt < FETCH_RETRIES - 1:
+            sleep_time = FETCH_BACKOFF * (2 ** attempt)
+            logger.warning(f"[{name}] Request failed (attempt {attempt + 1}/{FETCH_RETRIES}): {error!r}, retrying in {sleep_time}s")
+            await asyncio.sleep(sleep_time)
+        else:
+            logger.error(f"[{name}] Request failed after {FETCH_RETRIES} attempts: {error!r}")
+    return None
+
+def is_unseen(play, cursor):
+    """True if a play is newer than the station's high-water mark."""
+    if not cursor:
+        return True
+    if play["timestamp"] != cursor["timestamp"]:
+        return play["timestamp"] > cursor["timestamp"]
+    return play["id"] != cursor["id"]
+
+def upsert_plays(channel_name, plays):
+    """Upsert plays in one unordered bulk write and return (inserted plays, failed count).
+
+    A play inserted concurrently by another run surfaces as a duplicate key
+    error on its upsert; those are counted as already stored rather than failing
+    the batch.
+    """
+    if not plays:
+        return [], 0
+
+    failed = 0
+    operations = [
+        # ingestedAt comes from the server clock; snapshot_plays.py reads new plays by it
+        UpdateOne({"id": play["id"]}, {"$setOnInsert": play, "$currentDate": {"ingestedAt": True}}, upsert=True)
+        for play in plays
+    ]
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        upserted_indexes = result.upserted_ids.keys()
+    except pymongo.errors.BulkWriteError as e:
+        upserted_indexes = [upsert["index"] for upsert in e.details.get("upserted", [])]
+        write_errors = e.details.get("writeErrors", [])
+        duplicates = [error for error in write_errors if error.get("code") == 11000]
+        if duplicates:
+            logger.warning(f"[{channel_name}] {len(duplicates)} plays were inserted concurrently, skipping")
+        for error in write_errors:
+            if error.get("code") != 11000:
+                failed += 1
+                logger.error(f"[{channel_name}] Error upserting track ID {plays[error['index']]['id']}: {error.get('errmsg')}")
+
+    return [plays[index] for index in sorted(upserted_indexes)], failed
+
+def store_station_results(station, response):
+    """Upsert the plays newer than the station's cursor, advance the cursor and return the new plays."""
+    name = station["name"]
+    cursor = station.get("cursor")
+    if response["status"] == 304:
+        logger.info(f"[{name}] Not modified since last poll")
+        return []
+
+    data = response["data"]
+    channel_name = data.get("channel", {}).get("name", "")
+    results = data.get("results", [])
+    logger.info(f"[{channel_name}] Tracks received: {len(results)}")
+
+    plays = []
+    for item in results:
+        try:
+            title = title_case(item["track"]["title"])
+            artist = item["track"]["artists"][0] if item["track"]["artists"] else None
+            plays.append({
+                "id": item["id"],
+                "timestamp": parser.parse(item["timestamp"]),
+                "title": title,
+                "artist": artist,
+                "channel": channel_name,
+                **play_keys(artist, title)
+            })
+        except KeyError as e:
+            logger.error(f"[{channel_name}] KeyError processing track item: {e}")
+            continue
+        except Exception as e:
+            logger.error(f"[{channel_name}] Error processing track: {e}")
+            continue
+
+    unseen = [play for play in plays if is_unseen(play, cursor)]
+    logger.info(f"[{channel_name}] {len(unseen)} new, {len(plays) - len(unseen)} already seen")
+
+    station_new_tracks, failed = upsert_plays(channel_name, unseen)
+    logger.info(f"[{channel_name}] Tracks added: {len(station_new_tracks)}")
+
+    # Advance the high-water mark only once every unseen play is stored
+    update = {}
+    if unseen and not failed:
+        newest = max(unseen, key=lambda play: play["timestamp"])
+        update["cursor"] = {"id": newest["id"], "timestamp": newest["timestamp"]}
+    # Keep validators only for a fully stored response; after a failed write the
+    # next poll must be a full fetch, not a 304 that hides the lost plays
+    etag, last_modified = (None, None) if failed else (response["etag"], response["lastModified"])
+    if etag != station.get("etag") or last_modified != station.get("lastModified"):
+        update["etag"] = etag
+        update["lastModified"] = last_modified
+    if update:
+        stations_collection.update_one({"name": name}, {"$set": update})
+
+    # Count the new plays in the daily rollups
+    if station_new_tracks:
+        try:
+            rollups.record_plays(db, station_new_tracks)
+        except pymongo.errors.PyMongoError as e:
+            logger.error(f"[{channel_name}] Failed to update daily rollups: {e}")
+
+    timestamps = [play["timestamp"] for play in plays]
+    if timestamps:
+        time_span = max(timestamps) - min(timestamps)
+        total_seconds = int(time_span.total_seconds())
+        minutes, seconds = divmod(total_seconds, 60)
+        logger.info(f"[{channel_name}] Time Span: {minutes}m {seconds}s")
+    else:
+        logger.warning(f"[{channel_name}] No timestamps found")
+
+    return station_new_tracks
+
+async def poll_stations(stations, headers):
+    """Fetch all stations concurrently over one session, then store results and check first plays."""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    async with aiohttp.ClientSession() as session:
+        started = time.monotonic()
+        responses = await asyncio.gather(
+            *(fetch_station(session, semaphore, station, headers) for station in stations)
+        )
+        logger.info(f"Fetched {len(stations)} stations in {time.monotonic() - started:.1f}s")
+
+        all_new_tracks = []  # Collect all new tracks for first-play checking
+        station_stats = []
+        for station, response in zip(stations, responses):
+            if response is None:
+                station_stats.append({"name": station["name"], "status": "failed"})
+                continue
+            logger.info(f"Processing station: {station['name']}")
+            stats = {
+                "name": station["name"],
+                "status": "not_modified" if response["status"] == 304 else "ok",
+                "fetchSeconds": round(response["fetchSeconds"], 3),
+                "items": len((response["data"] or {}).get("results", [])),
+                "newPlays": 0
+            }
+            try:
+                new_tracks = store_station_results(station, response)
+                stats["newPlays"] = len(new_tracks)
+                all_new_tracks.extend(new_tracks)
+            except Exception as e:
+                stats["status"] = "failed"
+                logger.error(f"[{station['name']}] Unexpected error: {e}")
+            station_stats.append(stats)
+
+        # Check for first plays after processing all stations
+        if all_new_tracks:
+            logger.info(f"Checking {len(all_new_tracks)} new tracks for first plays")
+            await check_first_plays(session, all_new_tracks)
+
+        record_ingest_run(station_stats, started)
+
+def record_ingest_run(station_stats, started):
+    """Store this run's per-station fetch time and play counts for the API's /metrics."""
+    try:
+        ingest_runs_collection.insert_one({
+            "finishedAt": datetime.now(timezone.utc),
+            "durationSeconds": round(time.monotonic() - started, 3),
+            "stations": station_stats,
+            "items": sum(stats.get("items", 0) for stats in station_stats),
+            "newPlays": sum(stats.get("newPlays", 0) for stats in station_stats)
+        })
+    except pymongo.errors.PyMongoError as e:
+        logger.error(f"Failed to record ingest run: {e}")
+
 def fetch_and_store():
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
@@ -102,82 +343,12 @@ def fetch_and_store():
     }
     logger.info(f"Headers: {headers}")
 
-    # Load station names from MongoDB
-    station_docs = list(stations_collection.find({}, {"_id": 0, "name": 1}))
+    # Load stations, with their high-water marks and HTTP validators, from MongoDB
+    station_docs = list(stations_collection.find({}, {"_id": 0, "name": 1, "cursor": 1, "etag": 1, "lastModified": 1}))
     STATION_NAMES = [doc["name"] for doc in station_docs]
     logger.info(f"Loaded {len(STATION_NAMES)} stations from MongoDB: {STATION_NAMES}")
 
-    all_new_tracks = []  # Collect all new tracks for first-play checking
-
-    for station in STATION_NAMES:
-        logger.info(f"Processing station: {station}")
-        url = f"{BASE_URL}{station}"
-        logger.info(f"Requesting URL: {url}")
-        tracks_added = 0
-
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            channel_name = data.get("channel", {}).get("name", "")
-            results = data.get("results", [])
-            logger.info(f"[{channel_name}] Tracks received: {len(results)}")
-
-            for item in results:
-                try:
-                    track_info = {
-                        "id": item["id"],
-                        "timestamp": item["timestamp"],
-                        "title": ' '.join(word.capitalize() for word in item["track"]["title"].split()),
-                        "artist": item["track"]["artists"][0] if item["track"]["artists"] else None,
-                        "channel": channel_name
-                    }
-                    result = collection.update_one(
-                        {"id": track_info["id"]},
-                        {"$setOnInsert": track_info},
-                        upsert=True
-                    )
-                    if result.upserted_id:
-                        tracks_added += 1
-                        # Add to new tracks list for first-play checking
-                        all_new_tracks.append(track_info)
-
-                except KeyError as e:
-                    logger.error(f"[{channel_name}] KeyError processing track item: {e}")
-                    continue
-                except pymongo.errors.DuplicateKeyError as e:
-                    logger.warning(f"[{channel_name}] Duplicate key for track ID {item['id']}")
-                    continue
-                except Exception as e:
-                    logger.error(f"[{channel_name}] Error processing track: {e}")
-                    continue
-
-            logger.info(f"[{channel_name}] Tracks added: {tracks_added}")
-
-            try:
-                timestamps = [parser.parse(item["timestamp"]) for item in results]
-                if timestamps:
-                    time_span = max(timestamps) - min(timestamps)
-                    total_seconds = int(time_span.total_seconds())
-                    minutes, seconds = divmod(total_seconds, 60)
-                    logger.info(f"[{channel_name}] Time Span: {minutes}m {seconds}s")
-                else:
-                    logger.warning(f"[{channel_name}] No timestamps found")
-            except ValueError as e:
-                logger.error(f"[{channel_name}] Error parsing timestamps: {e}")
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"[{station}] Request error: {e}")
-            continue
-        except Exception as e:
-            logger.error(f"[{station}] Unexpected error: {e}")
-            continue
-
-    # Check for first plays after processing all stations
-    if all_new_tracks:
-        logger.info(f"Checking {len(all_new_tracks)} new tracks for first plays")
-        asyncio.run(check_first_plays(all_new_tracks))
+    asyncio.run(poll_stations(station_docs, headers))
     
     logger.info("Finished processing all stations")
 
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Find plays whose titles are near misses of tracked titles and record them as
+aliases the API's catalog consults.
+
+Exact matching compares match keys (see match_keys.py), so "Pt. 2" vs
+"Part 2" or a typo in either the sheet or the station metadata drops the
+play from counts and royalties. This job lists the distinct titles played
+under each tracked artist that match none of the artist's tracked titles
+(from the daily_plays rollups), generates candidates for each through a
+character trigram index over that artist's tracked titles and scores only
+those candidates. A title is aliased when its best candidate scores at least
+--min-score and beats the runner-up by --margin.
+
+Aliases go to sirius -> title_aliases as
+{artist_key, alias_key, alias, title_key, title, score, source}. Existing
+aliases, including ones entered by hand with source "manual", are never
+overwritten. The catalog version is bumped when aliases were added so
+running API workers reload.
+
+Usage:
+    python match_aliases.py [--min-score 0.88] [--margin 0.05] [--dry-run]
+"""
+
+import os
+import re
+import sys
+import argparse
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from match_keys import match_key
+
+logger = logging.getLogger(__name__)
+
+ALIASES_COLLECTION = "title_aliases"
+NGRAM_SIZE = 3
+CANDIDATES_PER_TITLE = 5
+DEFAULT_MIN_SCORE = 0.88
+DEFAULT_MARGIN = 0.05
+
+# Spellings that differ between the sheet and station metadata, applied to match keys before scoring
+SCORING_WORDS = {
+    "pt": "part", "pts": "parts", "vol": "volume", "ep": "episode",
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+    "i": "1", "ii": "2", "iii": "3", "iv": "4", "v": "5"
+}
+WORD = re.compile(r"\S+")
+
+def scoring_form(key):
+    return WORD.sub(lambda word: SCORING_WORDS.get(word.group(), word.group()), key)
+
+def ngrams(text, size=NGRAM_SIZE):
+    padded = f" {text} "
+    return {padded[i:i + size] for i in range(max(len(padded) - size + 1, 1))}
+
+class NgramIndex:
+    """Inverted index from character n-grams to the titles containing them."""
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.postings = defaultdict(list)
+        for position, title in enumerate(self.titles):
+            for gram in ngrams(title):
+                self.postings[gram].append(position)
+
+    def candidates(self, text, limit=CANDIDATES_PER_TITLE):
+        """The titles sharing the most n-grams with text, best first."""
+        shared = Counter()
+        for gram in ngrams(text):
+            shared.update(self.postings.get(gram, ()))
+        return [self.titles[position] for position, _ in shared.most_common(limit)]
+
+def best_match(index, title_key, min_score=DEFAULT_MIN_SCORE, margin=DEFAULT_MARGIN):
+    """Return (tracked scoring form, score, confident) for the closest tracked title, or None."""
+    query = scoring_form(title_key)
+    # SequenceMatcher indexes its second sequence once; quick_ratio() bounds ratio() from above
+    matcher = SequenceMatcher(None, autojunk=False)
+    matcher.set_seq2(query)
+    scored = []
+    for candidate in index.candidates(query):
+        matcher.set_seq1(candidate)
+        bound = matcher.quick_ratio()
+        scored.append((matcher.ratio() if bound >= min_score - margin else bound, candidate))
+    scored.sort(reverse=True)
+    if not scored:
+        return None
+    score, candidate = scored[0]
+    runner_up = scored[1][0] if len(scored) > 1 else 0.0
+    return candidate, score, score >= min_score and score - runner_up >= margin
+
+def tracked_titles(db):
+    """artist_key -> {title_key: tracked title} from tracked_artists."""
+    titles = defaultdict(dict)
+    for item in db["tracked_artists"].find({}, {"_id": 0, "artist": 1, "tracks": 1}):
+        for track in item.get("tracks", []):
+            titles[match_key(item["artist"])][match_key(track)] = track
+    return titles
+
+def unmatched_titles(db, titles, aliased):
+    """Distinct (artist_key, title_key, title, plays) played by tracked artists that match no tracked title."""
+    pipeline = [
+        {"$match": {"artist_key": {"$in": sorted(titles)}}},
+        {
+            "$group": {
+                "_id": {"artist_key": "$artist_key", "title_key": "$title_key"},
+                "title": {"$first": "$title"},
+                "plays": {"$sum": "$count"}
+            }
+        }
+    ]
+    for doc in db["daily_plays"].aggregate(pipeline, allowDiskUse=True):
+        artist_key, title_key = doc["_id"]["artist_key"], doc["_id"]["title_key"]
+        if not title_key or title_key in titles[artist_key] or (artist_key, title_key) in aliased:
+            continue
+        yield artist_key, title_key, doc["title"], doc["plays"]
+
+def find_aliases(db, min_score=DEFAULT_MIN_SCORE, margin=DEFAULT_MARGIN):
+    """Return (confident alias documents, near misses worth a manual look)."""
+    titles = tracked_titles(db)
+    aliased = {(doc["artist_key"], doc["alias_key"]) for doc in db[ALIASES_COLLECTION].find({}, {"artist_key": 1, "alias_key": 1})}
+
+    indexes = {}
+    by_scoring_form = {}
+    for artist_key, artist_titles in titles.items():
+        forms = {scoring_form(title_key): title_key for title_key in artist_titles}
+        by_scoring_form[artist_key] = forms
+        indexes[artist_key] = NgramIndex(forms)
+
+    aliases, near_misses = [], []
+    now = datetime.now(timezone.utc)
+    for artist_key, title_key, title, plays in unmatched_titles(db, titles, aliased):
+        match = best_match(indexes[artist_key], title_key, min_score, margin)
+        if match is None:
+            continue
+        candidate, score, confident = match
+        tracked_key = by_scoring_form[artist_key][candidate]
+        alias = {
+            "artist_key": artist_key,
+            "alias_key": title_key,
+            "alias": title,
+            "title_key": tracked_key,
+            "title": titles[artist_key][tracked_key],
+            "score": round(score, 3),
+            "plays": plays,
+            "source": "fuzzy",
+            "createdAt": now
+        }
+        if confident:
+            aliases.append(alias)
+        elif score >= min_score - 0.15:
+            near_misses.append(alias)
+    return aliases, near_misses
+
+def ensure_indexes(db):
+    db[ALIASES_COLLECTION].create_index([("artist_key", 1), ("alias_key", 1)], unique=True)
+
+def save_aliases(db, aliases):
+    """Insert aliases that aren't recorded yet and bump the catalog version. Returns how many were new."""
+    if not aliases:
+        return 0
+    ensure_indexes(db)
+    result = db[ALIASES_COLLECTION].bulk_write([
+        UpdateOne({"artist_key": alias["artist_key"], "alias_key": alias["alias_key"]}, {"$setOnInsert": alias}, upsert=True)
+        for alias in aliases
+    ], ordered=False)
+    if result.upserted_count:
+        # Running API workers reload the catalog, aliases included, when its version moves
+        db["catalog_meta"].update_one(
+            {"_id": "tracked_artists"},
+            {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    return result.upserted_count
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('match_aliases.log')
+        ]
+    )
+
+    arg_parser = argparse.ArgumentParser(description="Alias near-miss play titles to tracked titles")
+    arg_parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE, help="Lowest similarity (0-1) that is aliased")
+    arg_parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN, help="How far the best candidate must beat the runner-up")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Report matches without writing aliases")
+    args = arg_parser.parse_args()
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000, tz_aware=True)
+    try:
+        db = client["sirius"]
+        aliases, near_misses = find_aliases(db, args.min_score, args.margin)
+        for alias in aliases:
+            logger.info(f"  {alias['alias']!r} -> {alias['title']!r} ({alias['score']:.3f}, {alias['plays']} plays)")
+        for alias in near_misses:
+            logger.info(f"  not aliased: {alias['alias']!r} ~ {alias['title']!r} ({alias['score']:.3f}, {alias['plays']} plays)")
+        if args.dry_run:
+            logger.info(f"Dry run: {len(aliases)} aliases found, {len(near_misses)} near misses")
+        else:
+            inserted = save_aliases(db, aliases)
+            logger.info(f"✅ {inserted} new aliases saved, {len(near_misses)} near misses left for review")
+    except Exception as e:
+        logger.error(f"❌ Alias matching failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
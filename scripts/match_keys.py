@@ -0,0 +1,42 @@
+"""
+Canonical match keys for artist names and track titles.
+
+Every stored play, rollup bucket, first play and tracked artist carries
+artist_key/title_key fields built here, and all matching compares those keys
+with plain equality, so one compound index without a collation serves it.
+
+match_key() applies Unicode compatibility normalization, strips accents,
+case-folds, drops apostrophes, turns other punctuation into spaces and
+collapses whitespace:
+
+    "Don’t Stop (Live)"  -> "dont stop live"
+    "BEYONCÉ  &  Jay-Z"  -> "beyonce and jay z"
+
+Changing these rules changes stored keys; run backfill_match_keys.py after.
+"""
+
+import re
+import unicodedata
+
+APOSTROPHES = re.compile(r"['’‘`´]")
+NON_WORD = re.compile(r"[^\w]+")
+
+def match_key(value) -> str:
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold().replace("&", " and ")
+    text = APOSTROPHES.sub("", text)
+    text = NON_WORD.sub(" ", text).replace("_", " ")
+    return " ".join(text.split())
+
+def title_case(value: str) -> str:
+    """Display casing for titles: capitalize each whitespace-separated word.
+
+    Unlike str.title() this leaves letters after apostrophes alone ("Don't", not "Don'T").
+    """
+    return " ".join(word.capitalize() for word in value.split())
+
+def play_keys(artist, title) -> dict:
+    return {"artist_key": match_key(artist), "title_key": match_key(title)}
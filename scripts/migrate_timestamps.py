@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Convert play timestamps stored as ISO strings into native BSON dates.
+
+Rewrites comedy_tracks.timestamp, first_plays.timestamp/firstPlayDate and
+daily_plays.lastPlayed in _id order, one bulk write per batch. Progress is
+checkpointed in sirius -> migrations, so an interrupted run picks up where it
+stopped. The indexes the dashboard queries use are created by
+backfill_match_keys.py.
+
+Usage:
+    python migrate_timestamps.py [--batch-size 5000]
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import timezone
+from dateutil import parser
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(),
+        logging.FileHandler('migrate_timestamps.log')
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Fields to convert, per collection
+TARGETS = [
+    ("comedy_tracks", "timestamp"),
+    ("first_plays", "timestamp"),
+    ("first_plays", "firstPlayDate"),
+    ("daily_plays", "lastPlayed"),
+]
+
+def to_date(value):
+    dt = parser.parse(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+def migrate_field(db, collection_name, field, batch_size):
+    """Convert one string field to dates in resumable _id-ordered batches."""
+    collection = db[collection_name]
+    checkpoints = db["migrations"]
+    checkpoint_id = f"timestamps:{collection_name}.{field}"
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("lastId")
+    converted = 0
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(collection.find(query, {field: 1}).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            try:
+                operations.append(UpdateOne(
+                    {"_id": doc["_id"], field: doc[field]},
+                    {"$set": {field: to_date(doc[field])}}
+                ))
+            except (ValueError, OverflowError) as e:
+                logger.warning(f"[{collection_name}.{field}] Unparseable value on {doc['_id']}: {doc[field]!r} ({e})")
+
+        if operations:
+            result = collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        checkpoints.update_one({"_id": checkpoint_id}, {"$set": {"lastId": last_id}}, upsert=True)
+        logger.info(f"[{collection_name}.{field}] Converted {converted:,} so far")
+
+    logger.info(f"✅ [{collection_name}.{field}] Done, {converted:,} values converted")
+    return converted
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Convert string timestamps to BSON dates")
+    arg_parser.add_argument("--batch-size", type=int, default=5000)
+    args = arg_parser.parse_args()
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
+    try:
+        db = client["sirius"]
+        for collection_name, field in TARGETS:
+            migrate_field(db, collection_name, field, args.batch_size)
+        logger.info("Migration completed successfully")
+    except KeyboardInterrupt:
+        logger.warning("\n⚠️  Migration interrupted, re-run to resume")
+        sys.exit(1)
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
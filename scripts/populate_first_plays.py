@@ -1,9 +1,22 @@
+"""
+Record the earliest play of every tracked song in first_plays.
+
+One aggregation over comedy_tracks finds, for each tracked artist/title (by
+match key, see match_keys.py), the earliest play and its channel; the results
+are upserted with $setOnInsert, so songs that already have a first play are
+left alone and re-running is safe.
+
+Usage:
+    python populate_first_plays.py                # scan all plays
+    python populate_first_plays.py --incremental  # only plays since the latest first play
+"""
+
 import os
 import sys
-from pymongo import MongoClient
+import argparse
+from pymongo import MongoClient, UpdateOne
 from dotenv import load_dotenv
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from match_keys import match_key
 
 # Load environment variables
 load_dotenv()
@@ -15,57 +28,106 @@ collection = db["comedy_tracks"]
 tracked_artists_collection = db["tracked_artists"]
 first_plays_collection = db["first_plays"]
 
-def populate_existing_first_plays():
-    """Mark all existing tracked songs as already played"""
-    
-    # Get all tracked artists and their tracks
-    tracked_artists_data = list(tracked_artists_collection.find({}, {"_id": 0, "artist": 1, "tracks": 1}))
-    
-    # Create a set of all tracked artist/title combinations
-    tracked_combinations = set()
-    for item in tracked_artists_data:
-        artist = item["artist"]
+BATCH_SIZE = 1000
+
+def tracked_combinations():
+    """All tracked (artist_key, title_key) pairs."""
+    combinations = set()
+    for item in tracked_artists_collection.find({}, {"_id": 0, "artist": 1, "tracks": 1}):
         for track in item.get("tracks", []):
-            tracked_combinations.add((artist, track))
-    
-    print(f"Found {len(tracked_combinations)} tracked artist/song combinations")
-    
-    # Find all plays in comedy_tracks that match tracked combinations
-    existing_plays = {}
-    
-    for artist, title in tracked_combinations:
-        # Find the earliest play of this song
-        earliest_play = collection.find_one(
-            {"artist": artist, "title": title},
-            sort=[("timestamp", 1)]
-        )
-        
-        if earliest_play:
-            existing_plays[(artist, title)] = {
-                "artist": artist,
-                "title": title,
-                "firstPlayDate": earliest_play["timestamp"],
-                "channel": earliest_play["channel"],
-                "timestamp": earliest_play["timestamp"]
+            combinations.add((match_key(item["artist"]), match_key(track)))
+    return combinations
+
+def earliest_plays(combinations, since=None):
+    """Earliest play (timestamp and channel) of each tracked song, in one aggregation."""
+    match = {
+        "artist_key": {"$in": sorted({artist_key for artist_key, _ in combinations})},
+        "title_key": {"$in": sorted({title_key for _, title_key in combinations})},
+        # $min below compares in BSON type order, where null and unmigrated string
+        # timestamps sort ahead of every date and would win as the first play
+        "timestamp": {"$type": "date"}
+    }
+    if since is not None:
+        match["timestamp"]["$gte"] = since
+
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {"artist_key": "$artist_key", "title_key": "$title_key"},
+                "artist": {"$first": "$artist"},
+                "title": {"$first": "$title"},
+                # Documents compare field by field, so this keeps the earliest play's channel with it
+                "first": {"$min": {"timestamp": "$timestamp", "channel": "$channel"}}
             }
-    
-    print(f"Found {len(existing_plays)} existing plays of tracked songs")
-    
-    # Insert into first_plays collection
-    if existing_plays:
-        documents = list(existing_plays.values())
-        try:
-            # Use insert_many with ordered=False to continue on duplicates
-            result = first_plays_collection.insert_many(documents, ordered=False)
-            print(f"Successfully inserted {len(result.inserted_ids)} first plays")
-        except Exception as e:
-            print(f"Some duplicates encountered (expected): {e}")
-            # Count what actually got inserted
-            count = first_plays_collection.count_documents({})
-            print(f"Total documents in first_plays collection: {count}")
-    
+        }
+    ]
+    for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        artist_key, title_key = doc["_id"]["artist_key"], doc["_id"]["title_key"]
+        # $in on both fields also matches untracked artist/title crossings
+        if (artist_key, title_key) not in combinations:
+            continue
+        yield {
+            "artist": doc["artist"],
+            "title": doc["title"],
+            "artist_key": artist_key,
+            "title_key": title_key,
+            "firstPlayDate": doc["first"]["timestamp"],
+            "channel": doc["first"]["channel"],
+            "timestamp": doc["first"]["timestamp"]
+        }
+
+def upsert_first_plays(documents):
+    """Insert first plays that aren't recorded yet. Returns how many were new."""
+    inserted = 0
+    for start in range(0, len(documents), BATCH_SIZE):
+        batch = documents[start:start + BATCH_SIZE]
+        result = first_plays_collection.bulk_write([
+            UpdateOne(
+                {"artist_key": doc["artist_key"], "title_key": doc["title_key"]},
+                {"$setOnInsert": doc},
+                upsert=True
+            )
+            for doc in batch
+        ], ordered=False)
+        inserted += result.upserted_count
+    return inserted
+
+def populate_existing_first_plays(incremental=False):
+    """Mark all existing tracked songs as already played"""
+    combinations = tracked_combinations()
+    print(f"Found {len(combinations)} tracked artist/song combinations")
+    if not combinations:
+        return
+
+    since = None
+    if incremental:
+        latest = first_plays_collection.find_one({"timestamp": {"$ne": None}}, sort=[("timestamp", -1)])
+        since = latest["timestamp"] if latest else None
+        if since:
+            print(f"Only considering plays since {since}")
+        else:
+            print("No first plays recorded yet, scanning all plays")
+
+    documents = list(earliest_plays(combinations, since))
+    print(f"Found {len(documents)} tracked songs with plays")
+
+    inserted = upsert_first_plays(documents) if documents else 0
+    print(f"Inserted {inserted} new first plays, {len(documents) - inserted} already recorded")
     print("Populate first plays completed!")
 
 if __name__ == "__main__":
-    populate_existing_first_plays()
-    client.close()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Record the earliest play of every tracked song")
+    arg_parser.add_argument(
+        "--incremental", action="store_true",
+        help="Only consider plays since the latest recorded first play"
+    )
+    args = arg_parser.parse_args()
+
+    if not MONGO_URI:
+        print("MONGO_URI not set in environment variables")
+        sys.exit(1)
+    try:
+        populate_existing_first_plays(args.incremental)
+    finally:
+        client.close()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Daily play rollups for the comedy_tracks collection.
+
+Each document in sirius -> daily_plays counts the plays of one
+artist/title on one channel during one Eastern-time day, together with the
+most recent play timestamp seen for that bucket. getTracks.py keeps the
+rollups current with $inc as new plays are upserted; running this module
+directly rebuilds them from the raw plays (e.g. after a backfill).
+
+Usage:
+    python rollups.py                  # rebuild everything
+    python rollups.py --since 2025-01-01
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from dateutil import parser
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from match_keys import play_keys
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "daily_plays"
+ROLLUP_TIMEZONE = "America/New_York"
+EASTERN = ZoneInfo(ROLLUP_TIMEZONE)
+ROLLUP_KEY = ["artist", "title", "channel", "day"]
+
+def day_bucket(timestamp):
+    """Return the UTC instant of the Eastern-time midnight that starts the play's day."""
+    if isinstance(timestamp, str):
+        timestamp = parser.parse(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    local = timestamp.astimezone(EASTERN)
+    midnight = datetime(local.year, local.month, local.day, tzinfo=EASTERN)
+    return midnight.astimezone(timezone.utc)
+
+def rollup_update(play):
+    """Build the upsert that counts one newly stored play in its daily rollup."""
+    return UpdateOne(
+        {
+            "artist": play["artist"],
+            "title": play["title"],
+            "channel": play["channel"],
+            "day": day_bucket(play["timestamp"])
+        },
+        {
+            "$inc": {"count": 1},
+            "$max": {"lastPlayed": play["timestamp"]},
+            "$setOnInsert": play_keys(play["artist"], play["title"])
+        },
+        upsert=True
+    )
+
+def mark_plays_changed(db):
+    """Bump the plays data version so the API drops cached responses."""
+    db["data_versions"].update_one(
+        {"_id": "plays"},
+        {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+def record_plays(db, plays):
+    """Increment the daily rollups for plays that were just inserted into comedy_tracks."""
+    operations = [rollup_update(play) for play in plays if play.get("artist")]
+    if not operations:
+        return 0
+    db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+    mark_plays_changed(db)
+    return len(operations)
+
+def ensure_indexes(db):
+    rollups = db[ROLLUP_COLLECTION]
+    rollups.create_index([(field, 1) for field in ROLLUP_KEY], unique=True)
+    rollups.create_index("day")
+    rollups.create_index([("artist_key", 1), ("title_key", 1), ("day", 1)])
+
+def rebuild_rollups(db, since=None):
+    """Recompute daily_plays from comedy_tracks, optionally only for days on or after `since`.
+
+    Buckets are merged in place, so the dashboard never sees an empty rollup
+    collection while this runs. Match keys are copied from the plays, so run
+    backfill_match_keys.py first on plays stored before keys existed. Pause the getTracks.py cron while rebuilding, or
+    plays ingested mid-rebuild may be counted twice for the current day.
+    """
+    ensure_indexes(db)
+    played_at = {"$toDate": "$timestamp"}
+    match = {"artist": {"$ne": None}}
+    if since is not None:
+        match["$expr"] = {"$gte": [played_at, day_bucket(since)]}
+
+    pipeline = [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "artist": "$artist",
+                    "title": "$title",
+                    "channel": "$channel",
+                    "day": {"$dateTrunc": {"date": played_at, "unit": "day", "timezone": ROLLUP_TIMEZONE}}
+                },
+                "count": {"$sum": 1},
+                "lastPlayed": {"$max": "$timestamp"},
+                "artist_key": {"$first": "$artist_key"},
+                "title_key": {"$first": "$title_key"}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "artist": "$_id.artist",
+                "title": "$_id.title",
+                "channel": "$_id.channel",
+                "day": "$_id.day",
+                "count": 1,
+                "lastPlayed": 1,
+                "artist_key": 1,
+                "title_key": 1
+            }
+        },
+        {
+            "$merge": {
+                "into": ROLLUP_COLLECTION,
+                "on": ROLLUP_KEY,
+                "whenMatched": "merge",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
+    db["comedy_tracks"].aggregate(pipeline, allowDiskUse=True)
+    mark_plays_changed(db)
+    return db[ROLLUP_COLLECTION].count_documents({})
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('rollups.log')
+        ]
+    )
+
+    arg_parser = argparse.ArgumentParser(description="Rebuild the daily_plays rollup collection")
+    arg_parser.add_argument("--since", help="Only rebuild days on or after this date (YYYY-MM-DD, Eastern time)")
+    args = arg_parser.parse_args()
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000)
+    try:
+        since = datetime.fromisoformat(args.since).replace(tzinfo=EASTERN) if args.since else None
+        logger.info(f"Rebuilding {ROLLUP_COLLECTION}" + (f" since {args.since}" if since else ""))
+        total = rebuild_rollups(client["sirius"], since=since)
+        logger.info(f"✅ Rebuild complete, {total:,} rollup buckets")
+    except Exception as e:
+        logger.error(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Maintain the royalty_rates collection the API prices plays with.
+
+A rate gives the per-play Featured Artist and Rights Owner royalty for one
+channel ("*" for any channel) over [effectiveFrom, effectiveTo). Rates can be
+set by hand or learned from statement CSVs: learning takes the median per-play
+royalty of each channel in each Eastern calendar month of the statement. Hand
+set rates take precedence over learned ones where they overlap.
+
+Every change bumps data_versions {_id: "royalty_rates"} so the API reloads.
+
+Usage:
+    python royalty_rates.py learn shinex_export.csv [more.csv ...]
+    python royalty_rates.py set --channel "Raw Comedy" --from 2025-01-01 [--to 2025-07-01] --featured 16.77 --owner 20.59
+    python royalty_rates.py list
+"""
+
+import os
+import sys
+import argparse
+import logging
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+from dotenv import load_dotenv
+from statements import load_statement, STATEMENT_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+RATES_COLLECTION = "royalty_rates"
+ANY_CHANNEL = "*"
+EASTERN = ZoneInfo(STATEMENT_TIMEZONE)
+
+def ensure_indexes(db):
+    db[RATES_COLLECTION].create_index([("channel", 1), ("effectiveFrom", 1), ("source", 1)], unique=True)
+
+def mark_rates_changed(db):
+    """Bump the royalty_rates data version so the API reloads the table."""
+    db["data_versions"].update_one(
+        {"_id": "royalty_rates"},
+        {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+def month_start(year, month):
+    return datetime(year, month, 1, tzinfo=EASTERN).astimezone(timezone.utc)
+
+def statement_rates(statement):
+    """Median per-play royalties per channel and Eastern month, as rate documents."""
+    rows = statement[statement["played_at"].notna()].copy()
+    rows["featured"] = pd.to_numeric(rows["featured_royalty"], errors="coerce")
+    rows["owner"] = pd.to_numeric(rows["owner_royalty"], errors="coerce")
+    rows = rows[rows["featured"].notna() & rows["owner"].notna()]
+    if rows.empty:
+        return []
+    local = rows["played_at"].dt.tz_convert(STATEMENT_TIMEZONE)
+    rows["year"] = local.dt.year
+    rows["month"] = local.dt.month
+
+    medians = rows.groupby(["channel_name", "year", "month"]).agg(
+        featured=("featured", "median"),
+        owner=("owner", "median"),
+        plays=("featured", "size")
+    ).reset_index()
+
+    rates = []
+    for row in medians.itertuples():
+        next_year, next_month = (row.year + 1, 1) if row.month == 12 else (row.year, row.month + 1)
+        rates.append({
+            "channel": row.channel_name,
+            "effectiveFrom": month_start(row.year, row.month),
+            "effectiveTo": month_start(next_year, next_month),
+            "featuredRate": round(float(row.featured), 4),
+            "ownerRate": round(float(row.owner), 4),
+            "source": "statement",
+            "plays": int(row.plays)
+        })
+    return rates
+
+def learn_rates(db, statement):
+    """Upsert the monthly rates seen in a loaded statement. Returns how many rates were written."""
+    rates = statement_rates(statement)
+    if not rates:
+        return 0
+    ensure_indexes(db)
+    now = datetime.now(timezone.utc)
+    db[RATES_COLLECTION].bulk_write([
+        UpdateOne(
+            {"channel": rate["channel"], "effectiveFrom": rate["effectiveFrom"], "source": "statement"},
+            {"$set": {**rate, "updatedAt": now}},
+            upsert=True
+        )
+        for rate in rates
+    ], ordered=False)
+    mark_rates_changed(db)
+    return len(rates)
+
+def set_rate(db, channel, effective_from, effective_to, featured, owner):
+    ensure_indexes(db)
+    db[RATES_COLLECTION].update_one(
+        {"channel": channel, "effectiveFrom": effective_from, "source": "manual"},
+        {"$set": {
+            "effectiveTo": effective_to,
+            "featuredRate": featured,
+            "ownerRate": owner,
+            "updatedAt": datetime.now(timezone.utc)
+        }},
+        upsert=True
+    )
+    mark_rates_changed(db)
+
+def parse_day(value):
+    return datetime.fromisoformat(value).replace(tzinfo=EASTERN).astimezone(timezone.utc) if value else None
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('royalty_rates.log')
+        ]
+    )
+
+    arg_parser = argparse.ArgumentParser(description="Maintain per-channel royalty rates")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    learn = commands.add_parser("learn", help="Learn monthly per-channel rates from statement CSVs")
+    learn.add_argument("csv_files", nargs="+")
+    manual = commands.add_parser("set", help="Set a rate by hand")
+    manual.add_argument("--channel", default=ANY_CHANNEL, help='Channel name as stored in comedy_tracks ("*" for any)')
+    manual.add_argument("--from", dest="effective_from", required=True, help="First day the rate applies (YYYY-MM-DD, Eastern)")
+    manual.add_argument("--to", dest="effective_to", help="First day it no longer applies (open-ended if omitted)")
+    manual.add_argument("--featured", type=float, required=True, help="Featured Artist royalty per play")
+    manual.add_argument("--owner", type=float, required=True, help="Rights Owner royalty per play")
+    commands.add_parser("list", help="Print the rate table")
+    args = arg_parser.parse_args()
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000, tz_aware=True)
+    db = client["sirius"]
+    try:
+        if args.command == "learn":
+            for csv_file in args.csv_files:
+                written = learn_rates(db, load_statement(csv_file))
+                logger.info(f"✅ {csv_file}: {written} monthly channel rates learned")
+        elif args.command == "set":
+            set_rate(db, args.channel, parse_day(args.effective_from), parse_day(args.effective_to), args.featured, args.owner)
+            logger.info(f"✅ Rate set for {args.channel} from {args.effective_from}")
+        else:
+            for rate in db[RATES_COLLECTION].find({}, {"_id": 0}).sort([("channel", 1), ("effectiveFrom", 1)]):
+                until = rate["effectiveTo"].date() if rate.get("effectiveTo") else "open"
+                print(f"{rate['channel']:<35} {rate['effectiveFrom'].date()} - {until}  "
+                      f"featured {rate['featuredRate']:>8.4f}  owner {rate['ownerRate']:>8.4f}  ({rate['source']})")
+    except Exception as e:
+        logger.error(f"❌ {args.command} failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
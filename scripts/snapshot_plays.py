@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Incremental Parquet snapshot of comedy_tracks for offline analytics.
+
+Keeps a local dataset partitioned by play month:
+
+    plays_snapshot/
+        _watermark.json
+        month=2025-01/part-<watermark the run started from>.parquet
+        month=2025-02/...
+
+Each run reads only plays whose ingestedAt, stamped from the server clock by
+getTracks.py and insertMissing.py, is past the stored watermark, so plays
+backfilled with old timestamps are still picked up and land in the partition
+of the month they were played. ObjectIds come from each writer's own clock and
+are not ordered across hosts, so they are not used for this. A run re-reads
+INGEST_OVERLAP before the watermark to catch writes that committed late, and
+skips plays whose id is already in the partition. Part files of a run are
+written under temporary names and renamed before the watermark moves, so an
+interrupted run is simply redone by the next one.
+
+load_plays() reads selected columns from selected months through memory-mapped
+Arrow files, for scans over years of plays without touching Atlas.
+
+Usage:
+    python snapshot_plays.py snapshot [--dir plays_snapshot]
+    python snapshot_plays.py query --start 2024-01-01 --end 2025-01-01 [--top 20]
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from dateutil import parser
+from pymongo import MongoClient
+from dotenv import load_dotenv
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "plays_snapshot"
+WATERMARK_FILE = "_watermark.json"
+SNAPSHOT_FIELDS = ["_id", "id", "timestamp", "title", "artist", "channel"]
+SNAPSHOT_SCHEMA = pa.schema([
+    ("_id", pa.string()),
+    ("id", pa.string()),
+    ("timestamp", pa.timestamp("ms", tz="UTC")),
+    ("title", pa.string()),
+    ("artist", pa.string()),
+    ("channel", pa.string()),
+])
+# Rows buffered per month before they are written out as one row group
+ROW_GROUP_SIZE = 100000
+CURSOR_BATCH_SIZE = 10000
+# Plays ingested this long before the watermark are read again, for writes that committed late
+INGEST_OVERLAP = timedelta(minutes=10)
+
+def read_watermark(directory):
+    path = os.path.join(directory, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_watermark(directory, watermark):
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def to_utc(value):
+    if isinstance(value, str):
+        value = parser.parse(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def play_id(row):
+    """Key plays are deduplicated on: the play id, or the _id of the odd play without one."""
+    return row["id"] if row["id"] is not None else row["_id"]
+
+def month_partition(timestamp):
+    return f"month={timestamp:%Y-%m}"
+
+class MonthWriters:
+    """One open ParquetWriter per month touched by this run, fed in row-group sized chunks."""
+
+    def __init__(self, directory, part_name):
+        self.directory = directory
+        self.part_name = part_name
+        self.writers = {}
+        self.buffers = {}
+        self.seen_ids = {}
+
+    def stored_ids(self, partition):
+        """Play ids already in the partition's finished files, other than this run's own."""
+        ids = set()
+        partition_dir = os.path.join(self.directory, partition)
+        if os.path.isdir(partition_dir):
+            for name in os.listdir(partition_dir):
+                # A rerun overwrites its own part file, so its rows are written again
+                if name.endswith(".parquet") and name != self.part_name:
+                    table = pq.read_table(os.path.join(partition_dir, name), columns=["_id", "id"])
+                    ids.update(map(play_id, table.to_pylist()))
+        return ids
+
+    def add(self, row):
+        """Buffer a row unless its play is already in the partition. Returns whether it was added."""
+        partition = month_partition(row["timestamp"])
+        if partition not in self.seen_ids:
+            self.seen_ids[partition] = self.stored_ids(partition)
+        if play_id(row) in self.seen_ids[partition]:
+            return False
+        self.seen_ids[partition].add(play_id(row))
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(row)
+        if len(buffer) >= ROW_GROUP_SIZE:
+            self.flush(partition)
+        return True
+
+    def temp_path(self, partition):
+        return os.path.join(self.directory, partition, self.part_name + ".tmp")
+
+    def flush(self, partition):
+        rows = self.buffers.pop(partition, [])
+        if not rows:
+            return
+        writer = self.writers.get(partition)
+        if writer is None:
+            os.makedirs(os.path.join(self.directory, partition), exist_ok=True)
+            writer = pq.ParquetWriter(self.temp_path(partition), SNAPSHOT_SCHEMA, compression="snappy")
+            self.writers[partition] = writer
+        writer.write_table(pa.Table.from_pylist(rows, schema=SNAPSHOT_SCHEMA))
+
+    def close(self):
+        """Flush and close every writer, then move the finished files into place."""
+        for partition in list(self.buffers):
+            self.flush(partition)
+        for partition, writer in self.writers.items():
+            writer.close()
+            os.replace(self.temp_path(partition), self.temp_path(partition)[:-len(".tmp")])
+        return sorted(self.writers)
+
+def snapshot(db, directory=SNAPSHOT_DIR):
+    """Append plays ingested since the watermark to the dataset. Returns the number of rows added."""
+    os.makedirs(directory, exist_ok=True)
+    db["comedy_tracks"].create_index("ingestedAt")
+    watermark = read_watermark(directory)
+    last_ingested = watermark.get("ingestedAt")
+    if last_ingested:
+        last_ingested = to_utc(last_ingested)
+        query = {"ingestedAt": {"$gte": last_ingested - INGEST_OVERLAP}}
+    else:
+        # First run, or a dataset from before the ingestedAt watermark: read everything
+        query = {}
+
+    # Named after the watermark it starts from, so a rerun after a crash overwrites its own files
+    part_name = f"part-{last_ingested.strftime('%Y%m%dT%H%M%S%f') if last_ingested else 'initial'}.parquet"
+    writers = MonthWriters(directory, part_name)
+    projection = {field: 1 for field in SNAPSHOT_FIELDS + ["ingestedAt"]}
+    cursor = db["comedy_tracks"].find(query, projection).sort([("ingestedAt", 1), ("_id", 1)]).batch_size(CURSOR_BATCH_SIZE)
+
+    added = 0
+    read = 0
+    newest_ingested = last_ingested
+    for doc in cursor:
+        read += 1
+        if doc.get("ingestedAt"):
+            ingested = to_utc(doc["ingestedAt"])
+            newest_ingested = max(newest_ingested, ingested) if newest_ingested else ingested
+        if not doc.get("timestamp"):
+            continue
+        added += writers.add({
+            "_id": str(doc["_id"]),
+            "id": None if doc.get("id") is None else str(doc["id"]),
+            "timestamp": to_utc(doc["timestamp"]),
+            "title": doc.get("title"),
+            "artist": doc.get("artist"),
+            "channel": doc.get("channel")
+        })
+        if read % 100000 == 0:
+            logger.info(f"Progress: {read:,} plays read, {added:,} new")
+
+    partitions = writers.close()
+    if newest_ingested is not None:
+        write_watermark(directory, {
+            "ingestedAt": newest_ingested.isoformat(),
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
+            "rows": watermark.get("rows", 0) + added
+        })
+    logger.info(f"Wrote {added:,} plays to {len(partitions)} month partitions ({read - added:,} already stored or undated)")
+    return added
+
+def snapshot_months(directory, start=None, end=None):
+    """Partition directories overlapping [start, end)."""
+    months = []
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("month="):
+            continue
+        month = name[len("month="):]
+        if start is not None and month < f"{start:%Y-%m}":
+            continue
+        if end is not None and month > f"{end:%Y-%m}":
+            continue
+        months.append(name)
+    return months
+
+def load_plays(directory=SNAPSHOT_DIR, columns=None, start=None, end=None):
+    """Load plays in [start, end) from the snapshot as one Arrow table.
+
+    Only the requested columns of the overlapping month partitions are read,
+    each file through a memory map.
+    """
+    start = to_utc(start) if start is not None else None
+    end = to_utc(end) if end is not None else None
+    read_columns = list(columns) if columns else SNAPSHOT_SCHEMA.names
+    if (start is not None or end is not None) and "timestamp" not in read_columns:
+        read_columns.append("timestamp")
+
+    tables = []
+    for month in snapshot_months(directory, start, end):
+        month_dir = os.path.join(directory, month)
+        for name in sorted(os.listdir(month_dir)):
+            if name.endswith(".parquet"):
+                tables.append(pq.read_table(os.path.join(month_dir, name), columns=read_columns, memory_map=True))
+    if not tables:
+        return SNAPSHOT_SCHEMA.empty_table().select(read_columns)
+
+    table = pa.concat_tables(tables)
+    if start is not None:
+        table = table.filter(pc.greater_equal(table["timestamp"], pa.scalar(start, SNAPSHOT_SCHEMA.field("timestamp").type)))
+    if end is not None:
+        table = table.filter(pc.less(table["timestamp"], pa.scalar(end, SNAPSHOT_SCHEMA.field("timestamp").type)))
+    if columns and "timestamp" not in columns:
+        table = table.select(list(columns))
+    return table
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('snapshot_plays.log')
+        ]
+    )
+
+    arg_parser = argparse.ArgumentParser(description="Maintain and query a local Parquet snapshot of comedy_tracks")
+    arg_parser.add_argument("command", choices=["snapshot", "query"])
+    arg_parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot directory")
+    arg_parser.add_argument("--start", help="query: plays at or after this date (UTC)")
+    arg_parser.add_argument("--end", help="query: plays before this date (UTC)")
+    arg_parser.add_argument("--top", type=int, default=20, help="query: number of artists to list")
+    args = arg_parser.parse_args()
+
+    if args.command == "query":
+        started = datetime.now()
+        table = load_plays(args.dir, columns=["artist"], start=args.start and parser.parse(args.start), end=args.end and parser.parse(args.end))
+        counts = table.group_by("artist").aggregate([("artist", "count")]).sort_by([("artist_count", "descending")])
+        elapsed = (datetime.now() - started).total_seconds()
+        logger.info(f"{table.num_rows:,} plays in range, scanned in {elapsed:.2f}s")
+        for row in counts.slice(0, args.top).to_pylist():
+            print(f"{row['artist_count']:>8,}  {row['artist']}")
+        sys.exit(0)
+
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        logger.error("MONGO_URI not set in environment variables")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=30000, tz_aware=True)
+    try:
+        snapshot(client["sirius"], args.dir)
+    except Exception as e:
+        logger.error(f"❌ Snapshot failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
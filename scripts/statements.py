@@ -0,0 +1,81 @@
+"""
+Loading distributor statement CSVs.
+
+Two layouts are in use, both with the same column order:
+
+    Artist,Song,Channel,datetime,Featured Artist Royalties ($ USD),Rights Owner Royalties ($ USD)
+    artist,title,channel,timestamp,unused1,unused2        (missed_records.csv from checkTracks.py)
+
+Files may or may not carry the header row. Statement times are Eastern unless
+they carry an offset, and channels read like "96 : KevinHart Laugh Out Loud"
+where comedy_tracks stores "KevinHart Laugh Out Loud".
+"""
+
+import pandas as pd
+from dateutil import parser, tz
+from match_keys import match_key
+
+STATEMENT_TIMEZONE = "America/New_York"
+STATEMENT_COLUMNS = ["artist", "title", "channel", "timestamp", "featured_royalty", "owner_royalty"]
+# First cells that mark a header row rather than a play
+HEADER_FIRST_CELLS = {"artist"}
+
+def backfill_id_key(values: pd.Series) -> pd.Series:
+    """Case- and whitespace-insensitive key backfilled play ids are derived from.
+
+    Matching against stored plays uses the canonical artist_key/title_key from
+    match_keys.py instead.
+    """
+    # Never change this: insertMissing.py derives play ids from it, and different
+    # ids would import every previously backfilled play a second time
+    return values.fillna("").astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.casefold()
+
+def channel_name(values: pd.Series) -> pd.Series:
+    """Drop the "96 : " channel number prefix statements put in front of channel names."""
+    return values.fillna("").astype(str).str.split(":").str[-1].str.strip()
+
+def parse_played_at(values: pd.Series) -> pd.Series:
+    """Parse statement times to UTC; unparseable values become NaT."""
+    parsed = pd.to_datetime(values, errors="coerce")
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        # Mixed offsets; fall back to parsing value by value
+        parsed = pd.to_datetime(values.map(parse_one), errors="coerce", utc=True)
+    if parsed.dt.tz is None:
+        # Within the repeated fall-back hour take the first (EDT) reading; matching tolerances cover the hour
+        parsed = parsed.dt.tz_localize(STATEMENT_TIMEZONE, ambiguous=True, nonexistent="shift_forward")
+    return parsed.dt.tz_convert("UTC")
+
+def parse_one(value):
+    try:
+        dt = parser.parse(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz.gettz(STATEMENT_TIMEZONE))
+    return dt
+
+def load_statement(path) -> pd.DataFrame:
+    """Read a statement CSV into STATEMENT_COLUMNS plus derived matching columns.
+
+    Adds `line` (1-based line in the file), `played_at` (UTC, NaT when
+    unparseable), `artist_key`/`title_key`, `channel_name` and its `channel_key`.
+    """
+    df = pd.read_csv(path, header=None, dtype=str, keep_default_na=False, skipinitialspace=True)
+    df = df.iloc[:, :len(STATEMENT_COLUMNS)]
+    df.columns = STATEMENT_COLUMNS[:df.shape[1]]
+    for column in STATEMENT_COLUMNS[df.shape[1]:]:
+        df[column] = ""
+    df["line"] = df.index + 1
+
+    if len(df) and df.iloc[0]["artist"].strip().lower() in HEADER_FIRST_CELLS:
+        df = df.iloc[1:]
+
+    df = df.reset_index(drop=True)
+    for column in ["artist", "title", "channel", "timestamp"]:
+        df[column] = df[column].str.strip()
+    df["played_at"] = parse_played_at(df["timestamp"])
+    df["artist_key"] = df["artist"].map(match_key)
+    df["title_key"] = df["title"].map(match_key)
+    df["channel_name"] = channel_name(df["channel"])
+    df["channel_key"] = df["channel_name"].map(match_key)
+    return df
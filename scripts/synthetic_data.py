@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Fill a throwaway MongoDB with a synthetic sirius dataset for benchmarks.
+
+Writes tracked_artists, tracked_stations and comedy_tracks the way the
+sheet sync and getTracks.py would, then rebuilds the daily_plays rollups and
+creates the production indexes. At --scale 1 the dataset is about the size
+of production today; --scale 10 or 100 multiplies the play volume.
+
+Artist popularity, track popularity within an artist and channel share all
+follow Zipf-like distributions, plays spread over --years years with more of
+them in the daytime, and a small share of titles are spelled differently
+from the sheet ("Pt." vs "Part", case, dropped apostrophes) as station
+metadata often is. The same --seed always produces the same dataset.
+
+Only local servers are accepted unless --allow-remote is given, because
+--drop deletes the collections first.
+
+Usage:
+    python synthetic_data.py --mongo-uri mongodb://localhost:27017 [--scale 10] [--years 3] [--seed 7] [--drop]
+"""
+
+import sys
+import uuid
+import random
+import argparse
+import logging
+from itertools import accumulate
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient, uri_parser
+import rollups
+from match_keys import match_key, play_keys
+
+logger = logging.getLogger(__name__)
+
+DATABASE = "sirius"
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "mongo"}
+BATCH_SIZE = 10000
+
+# Production-sized dataset at --scale 1
+BASE_PLAYS = 250000
+TRACKED_ARTISTS = 150
+TRACKS_PER_ARTIST = 8
+UNTRACKED_ARTISTS = 2000
+CHANNELS = 24
+TRACKED_SHARE = 0.3
+VARIANT_SHARE = 0.02
+
+FIRST_NAMES = ["Ali", "Kevin", "Sam", "Maria", "Jo", "Dave", "Nikki", "Tom", "Iliza", "Hasan", "Taylor", "Bert",
+               "Jim", "Sarah", "Mike", "Amy", "John", "Whitney", "Ron", "Tig", "Gabriel", "Jerrod", "Fortune", "Nate"]
+LAST_NAMES = ["Wong", "Hart", "Jay", "Bamford", "Koy", "Chappelle", "Glaser", "Segura", "Shlesinger", "Minhaj",
+              "Tomlinson", "Kreischer", "Gaffigan", "Silverman", "Birbiglia", "Schumer", "Mulaney", "Cummings",
+              "White", "Notaro", "Iglesias", "Carmichael", "Feimster", "Bargatze"]
+WORDS = ["Airport", "Baby", "Cobra", "Marriage", "Dad", "Mom", "Grocery", "Dentist", "Wedding", "Dog", "Cat",
+         "Uber", "Gym", "Diet", "Texas", "Vegas", "Neighbors", "Hotel", "Church", "Doctor", "Party", "Therapy",
+         "Don't", "Can't", "Kids", "School", "Camping", "Pizza", "Coffee", "Road Trip", "Birthday", "Holiday"]
+CHANNEL_WORDS = ["Laugh", "Comedy", "Funny", "Stand-Up", "Raw", "Roadhouse", "Greats", "Underground", "Clean", "Nation"]
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative Zipf weights, ready for random.choices(cum_weights=...)."""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+def unique_names(rng, count, make):
+    names = set()
+    while len(names) < count:
+        names.add(make())
+    return sorted(names)
+
+def make_catalog(rng, artists=TRACKED_ARTISTS, tracks_per_artist=TRACKS_PER_ARTIST):
+    """Tracked artists as {artist, tracks} documents."""
+    def track_title():
+        title = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        if rng.random() < 0.1:
+            title += f" Pt. {rng.randint(1, 3)}"
+        return title
+
+    catalog = []
+    for artist in unique_names(rng, artists, lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.randint(1, 999)}"):
+        catalog.append({"artist": artist, "tracks": unique_names(rng, tracks_per_artist, track_title)})
+    return catalog
+
+def make_channels(rng, count=CHANNELS):
+    """(station name, channel name) pairs; tracked_stations stores the former, plays the latter."""
+    channels = unique_names(rng, count, lambda: f"{' '.join(rng.sample(CHANNEL_WORDS, 2))} {rng.randint(90, 999)}")
+    return [(channel.lower().replace(" ", "").replace("-", ""), channel) for channel in channels]
+
+def variant(rng, title):
+    """A spelling of title as station metadata might carry it."""
+    choice = rng.randrange(3)
+    if choice == 0 and "Pt." in title:
+        return title.replace("Pt.", "Part")
+    if choice == 1:
+        return title.upper()
+    return title.replace("'", "")
+
+def generate_plays(rng, catalog, untracked_artists, channels, count, start, end):
+    """Yield count play documents between start and end."""
+    tracked_weights = zipf_weights(len(catalog))
+    untracked_weights = zipf_weights(len(untracked_artists), 0.9)
+    track_weights = zipf_weights(max(len(item["tracks"]) for item in catalog), 1.3)
+    channel_weights = zipf_weights(len(channels), 0.8)
+    span = (end - start).total_seconds()
+    # Weight hours toward the day: fewer plays overnight
+    hour_weights = list(accumulate(0.4 if hour < 6 else 1.0 if hour < 18 else 0.8 for hour in range(24)))
+
+    for _ in range(count):
+        if rng.random() < TRACKED_SHARE:
+            item = rng.choices(catalog, cum_weights=tracked_weights)[0]
+            artist = item["artist"]
+            title = rng.choices(item["tracks"], cum_weights=track_weights[:len(item["tracks"])])[0]
+            if rng.random() < VARIANT_SHARE:
+                title = variant(rng, title)
+        else:
+            artist = rng.choices(untracked_artists, cum_weights=untracked_weights)[0]
+            title = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+
+        day = start + timedelta(seconds=rng.random() * span)
+        hour = rng.choices(range(24), cum_weights=hour_weights)[0]
+        timestamp = min(day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0), end)
+        channel = rng.choices(channels, cum_weights=channel_weights)[0][1]
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "timestamp": timestamp,
+            "title": title,
+            "artist": artist,
+            "channel": channel,
+            **play_keys(artist, title)
+        }
+
+def is_local(mongo_uri):
+    return all(host in LOCAL_HOSTS for host, _ in uri_parser.parse_uri(mongo_uri)["nodelist"])
+
+def ensure_indexes(db):
+    """The indexes getTracks.py, rollups.py and backfill_match_keys.py create in production."""
+    db["comedy_tracks"].create_index("id", unique=True)
+    db["comedy_tracks"].create_index([("artist_key", 1), ("title_key", 1), ("timestamp", 1)], name="artist_key_title_key_timestamp")
+    db["comedy_tracks"].create_index([("artist_key", 1), ("timestamp", 1), ("_id", 1)], name="artist_key_timestamp")
+    db["first_plays"].create_index([("artist_key", 1), ("title_key", 1)], unique=True, name="artist_key_title_key_unique")
+    db["tracked_artists"].create_index("artist", unique=True)
+    rollups.ensure_indexes(db)
+
+def generate(db, scale=1.0, years=3, seed=7, drop=False, end=None):
+    """Write the dataset. Returns {"catalog", "channels", "plays"} describing it."""
+    rng = random.Random(seed)
+    if drop:
+        for name in ["comedy_tracks", "daily_plays", "tracked_artists", "tracked_stations", "first_plays", "title_aliases", "catalog_meta"]:
+            db[name].drop()
+    ensure_indexes(db)
+
+    catalog = make_catalog(rng)
+    channels = make_channels(rng)
+    untracked = unique_names(rng, UNTRACKED_ARTISTS, lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}-{rng.randint(1000, 99999)}")
+
+    db["tracked_artists"].insert_many([
+        {**item, "artist_key": match_key(item["artist"]), "track_keys": [match_key(track) for track in item["tracks"]]}
+        for item in catalog
+    ])
+    db["tracked_stations"].insert_many([{"name": name} for name, _ in channels])
+    db["catalog_meta"].update_one(
+        {"_id": "tracked_artists"},
+        {"$inc": {"version": 1}, "$set": {"updatedAt": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+    end = end or datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - timedelta(days=365 * years)
+    count = int(BASE_PLAYS * scale)
+    batch = []
+    written = 0
+    for play in generate_plays(rng, catalog, untracked, channels, count, start, end):
+        batch.append(play)
+        if len(batch) == BATCH_SIZE:
+            db["comedy_tracks"].insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+            logger.info(f"Inserted {written:,}/{count:,} plays")
+    if batch:
+        db["comedy_tracks"].insert_many(batch, ordered=False)
+        written += len(batch)
+
+    logger.info("Rebuilding daily rollups")
+    rollups.rebuild_rollups(db)
+    logger.info(f"✅ {len(catalog)} tracked artists, {len(channels)} stations, {written:,} plays from {start.date()} to {end.date()}")
+    return {"catalog": catalog, "channels": channels, "plays": written}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic sirius dataset for benchmarks")
+    arg_parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help=f"Play volume as a multiple of {BASE_PLAYS:,}")
+    arg_parser.add_argument("--years", type=int, default=3)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    arg_parser.add_argument("--drop", action="store_true", help="Drop the generated collections first")
+    arg_parser.add_argument("--allow-remote", action="store_true", help="Allow a server other than localhost")
+    args = arg_parser.parse_args()
+
+    if not args.allow_remote and not is_local(args.mongo_uri):
+        logger.error("Refusing to write synthetic data to a remote server without --allow-remote")
+        sys.exit(1)
+
+    client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=30000, tz_aware=True)
+    try:
+        generate(client[DATABASE], args.scale, args.years, args.seed, args.drop)
+    except Exception as e:
+        logger.error(f"❌ Generation failed: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
@@ -0,0 +1,112 @@
+"""
+EmailOutbox against a local aiosmtpd server, without TLS or credentials.
+
+Runs on mongomock and aiosmtpd; install both to run these tests.
+"""
+
+import sys
+import time
+import socket
+import asyncio
+from pathlib import Path
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller  # noqa: E402
+from aiosmtpd.handlers import Message  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import email_outbox  # noqa: E402
+from email_outbox import EmailOutbox, SmtpSession  # noqa: E402
+
+class Inbox(Message):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def handle_message(self, message):
+        self.messages.append(message)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def inbox():
+    handler = Inbox()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.hostname, controller.port
+    controller.stop()
+
+@pytest.fixture
+def outbox(inbox):
+    _, host, port = inbox
+    return EmailOutbox(mongomock.MongoClient(tz_aware=True)["sirius"]["email_outbox"], SmtpSession(host, port, None, None, starttls=False))
+
+FIRST_PLAYS = [
+    {"artist": "Angie Stroud", "title": "Snake", "channel": "Raw Comedy"},
+    {"artist": "Angie Stroud", "title": "Creeps", "channel": "Laugh USA"},
+]
+
+def test_claimed_batch_is_delivered_without_credentials(inbox, outbox):
+    handler, _, _ = inbox
+    outbox.enqueue(FIRST_PLAYS)
+
+    assert outbox.send_batch() == 2
+
+    subjects = [message["Subject"] for message in handler.messages]
+    assert subjects == ["New Track Played on Sirius! Angie Stroud - Snake", "New Track Played on Sirius! Angie Stroud - Creeps"]
+    assert all(message["From"] == email_outbox.FIRST_PLAY_EMAIL_SENDER for message in handler.messages)
+    assert "Snake by Angie Stroud just played for the first time on Raw Comedy." in handler.messages[0].get_payload()
+    assert outbox.collection.count_documents({"status": "sent"}) == 2
+    assert outbox.send_batch() == 0
+    outbox.session.close()
+
+def test_digest_sends_one_message_per_batch(inbox, outbox):
+    handler, _, _ = inbox
+    outbox.digest = True
+    outbox.enqueue(FIRST_PLAYS)
+
+    assert outbox.send_batch() == 2
+
+    assert len(handler.messages) == 1
+    assert handler.messages[0]["Subject"] == "2 New Tracks Played on Sirius!"
+    outbox.session.close()
+
+def test_background_sender_drains_queue_and_stops(inbox, outbox):
+    handler, _, _ = inbox
+
+    async def scenario():
+        outbox.start()
+        await asyncio.to_thread(outbox.enqueue, FIRST_PLAYS)
+        deadline = time.monotonic() + 5
+        while len(handler.messages) < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await outbox.stop()
+
+    asyncio.run(scenario())
+
+    assert len(handler.messages) == 2
+    assert outbox.session.server is None
+
+def test_stop_mid_batch_hands_unsent_claims_back(inbox, outbox):
+    handler, _, _ = inbox
+    send = outbox.session.send
+
+    def send_then_stop(message):
+        send(message)
+        outbox._stopping.set()
+
+    outbox.session.send = send_then_stop
+    outbox.enqueue(FIRST_PLAYS)
+
+    assert outbox.send_batch() == 1
+
+    assert len(handler.messages) == 1
+    assert outbox.collection.count_documents({"status": "sent"}) == 1
+    assert outbox.collection.count_documents({"status": "pending", "claimToken": {"$exists": False}}) == 1
+    outbox.session.close()
@@ -0,0 +1,152 @@
+"""
+GoogleTokenVerifier with an RSA key generated here and a stubbed JWKS fetch.
+
+Tokens are issued against the real time (PyJWT checks exp with it); the
+verifier's own clock, which drives key expiry and backoff, is a fake.
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+
+import jwt
+import pytest
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import google_auth  # noqa: E402
+from google_auth import GoogleTokenVerifier  # noqa: E402
+
+CLIENT_ID = "client-id.apps.googleusercontent.com"
+NOW = int(time.time())
+
+class Clock:
+    def __init__(self):
+        self.now = float(NOW)
+
+    def __call__(self):
+        return self.now
+
+class StubJwks:
+    """Serves the public half of the given keys, or raises when failing."""
+
+    def __init__(self, keys, max_age=3600):
+        self.keys = keys
+        self.max_age = max_age
+        self.failing = False
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        if self.failing:
+            raise requests.ConnectionError("JWKS unavailable")
+        jwks = []
+        for kid, key in self.keys.items():
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+            jwks.append({**jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+        return {"keys": jwks}, self.max_age
+
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture(scope="module")
+def key():
+    return private_key()
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def token(key, kid="key-1", **claims):
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "email": "comic@example.com",
+        "iat": NOW,
+        "exp": NOW + 3600,
+        **claims
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+def verifier(stub, clock):
+    return GoogleTokenVerifier(CLIENT_ID, fetch=stub, clock=clock)
+
+def test_valid_token(key, clock):
+    stub = StubJwks({"key-1": key})
+    claims = verifier(stub, clock).verify(token(key))
+    assert claims["email"] == "comic@example.com"
+    assert stub.calls == 1
+
+def test_wrong_audience(key, clock):
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier(StubJwks({"key-1": key}), clock).verify(token(key, aud="someone-else"))
+
+def test_expired_token(key, clock):
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier(StubJwks({"key-1": key}), clock).verify(token(key, exp=NOW - 60))
+
+def test_wrong_issuer(key, clock):
+    with pytest.raises(jwt.InvalidIssuerError):
+        verifier(StubJwks({"key-1": key}), clock).verify(token(key, iss="https://evil.example.com"))
+
+def test_unknown_kid(key, clock):
+    stub = StubJwks({"key-1": key})
+    auth = verifier(stub, clock)
+    auth.verify(token(key))
+    clock.now += google_auth.UNKNOWN_KID_REFRESH_SECONDS
+    with pytest.raises(jwt.InvalidTokenError, match="Unknown signing key"):
+        auth.verify(token(private_key(), kid="key-2"))
+    # The unknown kid triggered one refresh, in case Google rotated keys
+    assert stub.calls == 2
+
+def test_rotated_key_is_fetched(key, clock):
+    rotated = private_key()
+    stub = StubJwks({"key-1": key})
+    auth = verifier(stub, clock)
+    auth.verify(token(key))
+    stub.keys["key-2"] = rotated
+    clock.now += google_auth.UNKNOWN_KID_REFRESH_SECONDS
+    assert auth.verify(token(rotated, kid="key-2"))["aud"] == CLIENT_ID
+
+def test_refresh_failure_uses_cached_key_and_backs_off(key, clock):
+    stub = StubJwks({"key-1": key}, max_age=60)
+    auth = verifier(stub, clock)
+    auth.verify(token(key))
+    stub.failing = True
+    clock.now += 120
+
+    # Keys are stale and the refresh fails, but the cached key still verifies
+    assert auth.verify(token(key, email="second@example.com"))["email"] == "second@example.com"
+    assert stub.calls == 2
+    # No new fetch while backing off
+    auth.verify(token(key, email="third@example.com"))
+    assert stub.calls == 2
+
+    clock.now += google_auth.REFRESH_FAILURE_BACKOFF_SECONDS
+    stub.failing = False
+    auth.verify(token(key, email="fourth@example.com"))
+    assert stub.calls == 3
+
+def test_refresh_failure_without_key_raises_fetch_error(key, clock):
+    stub = StubJwks({"key-1": key})
+    stub.failing = True
+    auth = verifier(stub, clock)
+    with pytest.raises(requests.RequestException):
+        auth.verify(token(key))
+    # Backing off: the same error again, without another fetch
+    with pytest.raises(requests.RequestException):
+        auth.verify(token(key, email="again@example.com"))
+    assert stub.calls == 1
+
+def test_verified_tokens_skip_key_refresh(key, clock):
+    stub = StubJwks({"key-1": key}, max_age=30)
+    auth = verifier(stub, clock)
+    signed = token(key)
+    auth.verify(signed)
+    stub.failing = True
+    clock.now += 60
+    # Keys are stale, but an already verified token is answered from the cache
+    assert auth.verify(signed)["email"] == "comic@example.com"
+    assert stub.calls == 1
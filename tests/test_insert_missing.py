@@ -0,0 +1,98 @@
+"""
+insertMissing.import_statement against a statement that overlaps scraped plays.
+
+Runs on mongomock; install it (pip install mongomock) to run these tests.
+"""
+
+import sys
+import inspect
+from pathlib import Path
+from datetime import datetime, timezone
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import insertMissing  # noqa: E402
+from match_keys import play_keys  # noqa: E402
+
+@pytest.fixture
+def db(monkeypatch):
+    # pymongo 4.9+ passes sort= to the bulk builder, which older mongomock releases do not accept
+    builder = mongomock.collection.BulkOperationBuilder
+    if "sort" not in inspect.signature(builder.add_update).parameters:
+        add_update = builder.add_update
+        monkeypatch.setattr(builder, "add_update", lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs))
+    return mongomock.MongoClient(tz_aware=True)["sirius"]
+
+def scraped(play_id, artist, title, channel, timestamp):
+    return {"id": play_id, "artist": artist, "title": title, "channel": channel, "timestamp": timestamp, **play_keys(artist, title)}
+
+def write_statement(tmp_path, rows):
+    path = tmp_path / "statement.csv"
+    path.write_text("".join(f"{artist},{title},{channel},{timestamp},-,-\n" for artist, title, channel, timestamp in rows))
+    return str(path)
+
+def test_statement_overlapping_scraped_plays_adds_no_duplicates(db, tmp_path):
+    db["comedy_tracks"].insert_many([
+        # getTracks.py stores plays under their xmplaylist ids, a few seconds off the statement times
+        scraped("xm-1", "Angie Stroud", "Six Roommates", "Raw Comedy", datetime(2025, 7, 7, 22, 0, 40, tzinfo=timezone.utc)),
+        scraped("xm-2", "Angie Stroud", "Creeps", "Raw Comedy", datetime(2025, 7, 2, 21, 0, 5, tzinfo=timezone.utc)),
+    ])
+    csv_file = write_statement(tmp_path, [
+        ("Angie Stroud", "Six Roommates", "99 : Raw Comedy", "2025-07-07 18:00:11"),
+        ("Angie Stroud", "Creeps", "99 : Raw Comedy", "2025-07-02 17:00:11"),
+        ("Angie Stroud", "Snake", "99 : Raw Comedy", "2025-06-29 21:00:07"),
+    ])
+
+    counts = insertMissing.import_statement(db, csv_file)
+
+    assert counts["matched"] == 2
+    assert counts["inserted"] == 1
+    plays = db["comedy_tracks"]
+    assert plays.count_documents({}) == 3
+    for title in ["Six Roommates", "Creeps", "Snake"]:
+        assert plays.count_documents({"title": title}) == 1
+
+    # Importing the same statement again adds nothing
+    counts = insertMissing.import_statement(db, csv_file)
+    assert counts["matched"] == 3
+    assert counts["inserted"] == 0
+    assert plays.count_documents({}) == 3
+
+def test_statement_with_no_stored_plays_is_imported(db, tmp_path):
+    csv_file = write_statement(tmp_path, [
+        ("Angie Stroud", "Snake", "99 : Raw Comedy", "2025-06-29 21:00:07"),
+        ("Angie Stroud", "Creeps", "99 : Raw Comedy", "2025-07-02 17:00:11"),
+    ])
+
+    counts = insertMissing.import_statement(db, csv_file)
+
+    assert counts["matched"] == 0
+    assert counts["inserted"] == 2
+    assert db["comedy_tracks"].count_documents({}) == 2
+
+def test_rows_sharing_one_stored_play_import_all_but_the_closest(db, tmp_path):
+    db["comedy_tracks"].insert_one(
+        scraped("xm-1", "Angie Stroud", "Snake", "Raw Comedy", datetime(2025, 6, 30, 1, 0, 30, tzinfo=timezone.utc))
+    )
+    csv_file = write_statement(tmp_path, [
+        ("Angie Stroud", "Snake", "99 : Raw Comedy", "2025-06-29 21:00:07"),
+        # Same channel 40 minutes later: only one of the two rows can be the stored play
+        ("Angie Stroud", "Snake", "99 : Raw Comedy", "2025-06-29 21:40:07"),
+        # Another channel 40 minutes earlier never matches the Raw Comedy play
+        ("Angie Stroud", "Snake", "98 : Laugh USA", "2025-06-29 20:20:07"),
+    ])
+
+    counts = insertMissing.import_statement(db, csv_file)
+
+    assert counts["matched"] == 1
+    assert counts["inserted"] == 2
+    plays = db["comedy_tracks"]
+    assert plays.count_documents({"channel": "Raw Comedy"}) == 2
+    assert plays.count_documents({"channel": "Laugh USA"}) == 1
+
+    counts = insertMissing.import_statement(db, csv_file)
+    assert counts["inserted"] == 0
+    assert plays.count_documents({}) == 3